@@ -3,8 +3,9 @@
 from lib.argparse import common_parser, parse_config, parse_parameters
 from lib.config import read_config
 from lib.deployment import Deployment
-from lib.log import debug, set_log_level
+from lib.log import debug, info, set_log_level
 from lib.parameters import read_parameters, validate_parameters
+from lib.trace import tracer
 
 
 def parse_arguments():
@@ -28,7 +29,14 @@ def main():
     parameters = read_parameters(args.parameters_file)
     validate_parameters(parameters)
     deployment = Deployment(config, parameters, assume_yes=args.assumeyes)
-    deployment.create()
+    try:
+        deployment.create()
+    finally:
+        # also after a failure, the timing shows where it happened
+        trace_file = 'audit/{}.trace.json'.format(deployment.name)
+        tracer.write(trace_file)
+        info(tracer.waterfall())
+        info('Trace written to', trace_file)
 
 
 if __name__ == '__main__':
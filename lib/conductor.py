@@ -5,9 +5,13 @@ from lib.router import Router
 class Conductor(Router):
     default_node_role = 'conductor'
 
-    def deploy(self):
-        """Customize deploy method."""
-        super().deploy()
+    def schedule_deploy(self, scheduler):
+        """Customize deploy tasks."""
+        synced = super().schedule_deploy(scheduler)
+        ready = [synced]
         for node in self.nodes:
-            node.install_license()
-            node.prepare_netconf()
+            ready.append(scheduler.add(
+                '{}: prepare netconf'.format(node.name),
+                node.prepare_conductor, [synced]))
+        return scheduler.add('{}: netconf ready'.format(self.name),
+                             lambda: None, ready)
@@ -1,12 +1,21 @@
-from lib.ote_utils.utils import Config
-from jinja2 import Environment, FileSystemLoader, meta
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from lib.ote_utils.netconfutils.netconfconverter import NetconfConverter
+from lib import template_cache
 from jinja2.exceptions import TemplateNotFound
+from lxml import etree
 import os
+import threading
 
 TEMPLATE_DIR = 'config_templates'
+# number of loaded config models (i.e. 128T versions) kept per process
+MODEL_REGISTRY_SIZE = 4
+
+_model_registry = OrderedDict()
+_model_registry_lock = threading.Lock()
 
 def _load_config_template_environment():
-  return Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+  return template_cache.get_environment(TEMPLATE_DIR)
 
 def _create_config(context, template_file):
   JINJA = _load_config_template_environment()
@@ -26,15 +35,46 @@ def list_config_templates():
   return JINJA.list_templates(filter_func=_filter_out_test_templates)
 
 def show_template_variables(template_name):
-  JINJA = _load_config_template_environment()
-  template_source = JINJA.loader.get_source(JINJA, template_name)[0]
-  parsed_content = JINJA.parse(template_source)
-  return meta.find_undeclared_variables(parsed_content)
+  return template_cache.get_template_variables(TEMPLATE_DIR, template_name)
+
+def _load_config_model(model):
+  converter = NetconfConverter()
+  converter.load_config_model(model, use_cache=True)
+  return converter
+
+def get_config_model(model):
+  """Return a converter for the model, shared by all threads of the process.
+
+  Models are keyed by path and mtime, so a replaced model file is loaded
+  again. The least recently used model is evicted once more than
+  MODEL_REGISTRY_SIZE models are loaded.
+  """
+  path = getattr(model, 'name', model)
+  if not isinstance(path, str) or not os.path.isfile(path):
+    # nothing to key on, e.g. an in-memory file
+    return _load_config_model(model)
+
+  path = os.path.abspath(path)
+  key = (path, os.stat(path).st_mtime_ns)
+  with _model_registry_lock:
+    converter = _model_registry.get(key)
+    if converter:
+      _model_registry.move_to_end(key)
+      return converter
+
+  # load outside of the lock, other models stay available meanwhile
+  converter = _load_config_model(path)
+  with _model_registry_lock:
+    converter = _model_registry.setdefault(key, converter)
+    _model_registry.move_to_end(key)
+    while len(_model_registry) > MODEL_REGISTRY_SIZE:
+      _model_registry.popitem(last=False)
+  return converter
 
 def _convert_config_to_xml(text_config, model):
-  cc = Config.Config()
-  cc.load_t128_config_model(model)
-  config_xml = cc.convert_config_to_netconf_xml(text_config.split('\n'))
+  converter = get_config_model(model)
+  config_xml = converter.convert_config_to_netconf_xml(
+    text_config.split('\n'), 'config')
   return config_xml
 
 def get_text_config(context, template_file):
@@ -44,3 +84,51 @@ def get_text_config(context, template_file):
 def get_xml_config(config_text, model='/var/model/consolidatedT128Model.xml'):
   config_xml = _convert_config_to_xml(config_text, model)
   return config_xml
+
+def _init_batch_worker(model):
+  # load the model once per worker, jobs find it in the registry
+  get_config_model(model)
+
+def _render_xml_config(context, template_file, model):
+  config_text = _create_config(context, template_file)
+  return etree.tostring(get_xml_config(config_text, model))
+
+def get_xml_configs(jobs, model='/var/model/consolidatedT128Model.xml',
+                    max_workers=None):
+  """Render and convert (context, template_file) pairs in parallel.
+
+  The jobs are spread over a pool of processes, each loading the model once
+  at startup. Contexts have to be picklable. Returns the serialized XML of
+  each job, in order.
+  """
+  jobs = list(jobs)
+  if not jobs:
+    return []
+  # file objects cannot be handed to the workers, their name can
+  model = getattr(model, 'name', model)
+  contexts, template_files = zip(*jobs)
+  max_workers = max_workers or os.cpu_count() or 1
+  chunksize = max(1, len(jobs) // (max_workers * 4))
+  with ProcessPoolExecutor(max_workers=max_workers,
+                           initializer=_init_batch_worker,
+                           initargs=(model,)) as executor:
+    return list(executor.map(_render_xml_config, contexts, template_files,
+                             [model] * len(jobs), chunksize=chunksize))
+
+def get_text_config_from_xml(config_xml,
+                             model='/var/model/consolidatedT128Model.xml'):
+  """Convert Netconf XML, e.g. a get-config reply, back to text config."""
+  converter = get_config_model(model)
+  return converter.convert_netconf_xml_to_config(config_xml)
+
+def write_xml_config(context, template_file, output,
+                     model='/var/model/consolidatedT128Model.xml'):
+  """Render a template and stream its Netconf XML to a binary file object.
+
+  Neither the rendered text nor the XML tree are held in memory as a whole.
+  """
+  JINJA = _load_config_template_environment()
+  template = JINJA.get_template(template_file)
+  converter = get_config_model(model)
+  converter.write_config_as_netconf_xml(
+    template.generate(context), output, 'config')
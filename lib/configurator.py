@@ -1,8 +1,24 @@
 from ncclient import manager
 from ncclient.operations.errors import TimeoutExpiredError
+from ncclient.operations.rpc import RPCError
 from ncclient.transport.errors import TransportError
 
 from lxml import etree
+import threading
+import time
+
+
+def _connect(host, port, username, key_filename):
+    return manager.connect(
+        host=host,
+        port=port,
+        username=username,
+        key_filename=key_filename,
+        allow_agent=True,
+        look_for_keys=False,
+        hostkey_verify=False,
+        timeout=1200
+    )
 
 # We'll use this to interact with Netconf
 class ncclientAgent(object):
@@ -32,9 +48,18 @@ class ncclientAgent(object):
           vt.text = validationType
           commit_command.append(vt)
           commit_status = self.netconf_session.dispatch(commit_command)
-        self.netconf_session.close_session()
         return commit_status
 
+    def validateConfig(self, source_config):
+        validate_status = None
+        if ':validate' in self.netconf_session.server_capabilities:
+            validate_status = self.netconf_session.validate(source=source_config)
+        return validate_status
+
+    def discardChanges(self):
+        discard_status = self.netconf_session.discard_changes()
+        return discard_status
+
 # We can simplify the 128T actions to push config and commit
 class t128Configurator(object):
 
@@ -54,19 +79,167 @@ class t128Configurator(object):
         commit_status = self.config_agent.commitConfig(validationType=validationType)
         return commit_status
 
+    def validate(self):
+        validate_status = self.config_agent.validateConfig("candidate")
+        return validate_status
+
+    def discard(self):
+        discard_status = self.config_agent.discardChanges()
+        return discard_status
+
+
+class t128ConfigError(Exception):
+    """Applying a config failed, step tells in which step."""
+
+    def __init__(self, step, message):
+        self.step = step
+        super().__init__('{} failed: {}'.format(step, message))
+
+# Pool of NETCONF sessions, so several pushes to a conductor share them
+class t128SessionPool(object):
+
+    def __init__(self, max_sessions=4, idle_timeout=300, keepalive=30,
+                 metrics=None, reap_interval=10):
+        """Keep up to max_sessions sessions per conductor.
+
+        Idle sessions are closed after idle_timeout seconds and kept alive
+        with an ssh keepalive every keepalive seconds meanwhile. A reaper
+        thread looks for expired sessions every reap_interval seconds. The
+        RPCs on all sessions are recorded in metrics, a SessionMetrics, if
+        given.
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.metrics = metrics
+        self._condition = threading.Condition()
+        self._idle = {}
+        self._busy = {}
+        self._keys = {}
+        self._closed = threading.Event()
+        self._reaper = threading.Thread(
+            target=self._reap, args=(min(idle_timeout, reap_interval),),
+            name='netconf-pool-reaper', daemon=True)
+        self._reaper.start()
+
+    def checkout(self, host, port, username, key_filename, timeout=None):
+        """Borrow a healthy session, connect if none is idle.
+
+        Waits up to timeout seconds (forever if None) while max_sessions
+        sessions to the conductor are checked out.
+        """
+        key = (host, str(port), username, key_filename)
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                self._expire()
+                idle = self._idle.get(key, [])
+                while idle:
+                    netconf_session, _ = idle.pop()
+                    if self._is_healthy(netconf_session):
+                        self._busy[key] = self._busy.get(key, 0) + 1
+                        return netconf_session
+                    self._keys.pop(netconf_session, None)
+                if self._busy.get(key, 0) < self.max_sessions:
+                    self._busy[key] = self._busy.get(key, 0) + 1
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutExpiredError(
+                        'No NETCONF session available for {}'.format(host))
+                self._condition.wait(remaining)
+
+        # connect outside of the lock, it takes a while
+        try:
+            netconf_session = _connect(host, port, username, key_filename)
+            netconf_session._session.transport.set_keepalive(self.keepalive)
+            netconf_session._session.set_metrics(self.metrics)
+        except BaseException:
+            with self._condition:
+                self._busy[key] -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._keys[netconf_session] = key
+        return netconf_session
+
+    def checkin(self, netconf_session, discard=False):
+        """Return a session to the pool, close it instead if discard is set."""
+        with self._condition:
+            key = self._keys.get(netconf_session)
+            if key is None:
+                return
+            self._busy[key] -= 1
+            if (discard or self._closed.is_set() or
+                    not self._is_healthy(netconf_session)):
+                del self._keys[netconf_session]
+            else:
+                self._idle.setdefault(key, []).append(
+                    (netconf_session, time.time()))
+                netconf_session = None
+            self._condition.notify()
+        if netconf_session is not None:
+            _close_session(netconf_session)
+
+    def close(self):
+        """Close all idle sessions, and the busy ones once checked in."""
+        self._closed.set()
+        with self._condition:
+            idle = [netconf_session for sessions in self._idle.values()
+                    for netconf_session, _ in sessions]
+            self._idle = {}
+            for netconf_session in idle:
+                del self._keys[netconf_session]
+        _close_sessions(idle)
+
+    def _reap(self, interval):
+        # keepalives would hold expired sessions open until the next checkout
+        while not self._closed.wait(interval):
+            with self._condition:
+                self._expire()
+
+    def _expire(self):
+        # called with the lock held, closing happens in the background
+        expired = []
+        now = time.time()
+        for key, idle in self._idle.items():
+            for entry in list(idle):
+                if now - entry[1] > self.idle_timeout:
+                    idle.remove(entry)
+                    expired.append(entry[0])
+                    del self._keys[entry[0]]
+        if expired:
+            threading.Thread(target=_close_sessions, args=(expired,),
+                             daemon=True).start()
+
+    def _is_healthy(self, netconf_session):
+        return (netconf_session.connected and
+                netconf_session._session.transport.is_active())
+
+
+def _close_session(netconf_session):
+    try:
+        netconf_session.close_session()
+    except (TransportError, TimeoutExpiredError, RPCError):
+        pass
+
+
+def _close_sessions(netconf_sessions):
+    for netconf_session in netconf_sessions:
+        _close_session(netconf_session)
+
+
 class t128ConfigHelper(object):
 
-    def __init__(self, host='127.0.0.1', port='830', username='admin', key_filename='/home/admin/.ssh/pdc_ssh_key'):
-        self.netconf_session = manager.connect(
-            host=host,
-            port=port,
-            username=username,
-            key_filename=key_filename,
-            allow_agent=True,
-            look_for_keys=False,
-            hostkey_verify=False,
-            timeout=1200
-        )
+    def __init__(self, host='127.0.0.1', port='830', username='admin', key_filename='/home/admin/.ssh/pdc_ssh_key', pool=None, metrics=None):
+        self.pool = pool
+        if pool:
+            self.netconf_session = pool.checkout(host, port, username, key_filename)
+            self.metrics = pool.metrics
+        else:
+            self.netconf_session = _connect(host, port, username, key_filename)
+            self.netconf_session._session.set_metrics(metrics)
+            self.metrics = metrics
         ncclient_agent = ncclientAgent(self.netconf_session)
         self.t128_configurator = t128Configurator(ncclient_agent)
 
@@ -74,18 +247,99 @@ class t128ConfigHelper(object):
         return self
 
     def __exit__(self, *args):
+        if self.pool:
+            # a session which has seen an error is not trusted anymore
+            self.pool.checkin(self.netconf_session, discard=args[0] is not None)
+            return
         try:
             self.netconf_session.close_session()
         except TransportError:
             #print("we had a transport error for whatever reason")
             pass
 
+    def dump_metrics(self):
+        """Return the NETCONF RPC timings and sizes as a dict, None if
+        they are not recorded."""
+        if self.metrics is None:
+            return None
+        return self.metrics.to_dict()
+
     def edit(self, config_xml, err_msg):
         try:
             return self.t128_configurator.config(config_xml, 'edit')
         except TimeoutExpiredError:
             return err_msg
 
+    def push_diff(self, config_xml, converter, err_msg, prune=False):
+        """Edit the candidate config with the changes to the running config only.
+
+        The running config is fetched for the parts config_xml touches and
+        diffed using the converter's model. With prune set, config below the
+        list entries of config_xml which it lacks is deleted (see
+        NetconfConverter.diff_netconf_xml). Returns None when the running
+        config is already up to date.
+        """
+        try:
+            diff_xml = self._get_diff(config_xml, converter, prune)
+            if diff_xml is None:
+                return None
+            return self.t128_configurator.config(diff_xml, 'edit')
+        except TimeoutExpiredError:
+            return err_msg
+
+    def apply(self, config_xml, validation_type='distributed', converter=None,
+              prune=False):
+        """Edit, validate and commit a config on this session.
+
+        With a converter only the changes to the running config are pushed
+        (see push_diff, which prune is passed to) and None is returned when there are none. Otherwise
+        the commit status is returned. If a step fails the candidate config
+        is discarded and t128ConfigError is raised. The session stays open
+        for further calls.
+        """
+        step = 'diff'
+        try:
+            if converter:
+                config_xml = self._get_diff(config_xml, converter, prune)
+                if config_xml is None:
+                    return None
+            step = 'edit'
+            self._check_status(
+                step, self.t128_configurator.config(config_xml, 'edit'))
+            step = 'validate'
+            self._check_status(step, self.t128_configurator.validate())
+            step = 'commit'
+            return self._check_status(
+                step, self.t128_configurator.commit(validation_type))
+        except t128ConfigError:
+            self._discard()
+            raise
+        except TimeoutExpiredError:
+            self._discard()
+            raise t128ConfigError(step, 'timeout on Netconf API')
+        except RPCError as e:
+            self._discard()
+            raise t128ConfigError(step, e)
+
+    def _get_diff(self, config_xml, converter, prune=False):
+        running = self.netconf_session.get_config(
+            source='running',
+            filter=converter.build_netconf_filter(config_xml))
+        return converter.diff_netconf_xml(running.data_ele, config_xml,
+                                          prune=prune)
+
+    def _check_status(self, step, status):
+        # validate is skipped when the server does not support it
+        if status is not None and not status.ok:
+            raise t128ConfigError(step, status.error)
+        return status
+
+    def _discard(self):
+        try:
+            self.t128_configurator.discard()
+        except (RPCError, TimeoutExpiredError, TransportError):
+            pass
+
     def commit(self):
         try:
             return self.t128_configurator.commit()
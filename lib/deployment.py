@@ -2,9 +2,13 @@
 import os
 
 from lib.conductor import Conductor
+from lib.journal import Journal
 from lib.log import fatal, info
-from lib.router import Headend
+from lib.router import Headend, NoNodeDeployedException
 from lib.providers import get_provider
+from lib.scheduler import Scheduler
+from lib.trace import traced
+from lib.vm import close_ssh_masters
 
 
 class Deployment(object):
@@ -16,6 +20,12 @@ class Deployment(object):
         self.set_parameters()
         self.load_hypervisors()
         self.branches = []
+        # completed steps, a failed deployment resumes where it stopped
+        self.journal = Journal('audit/{}.journal.json'.format(self.name))
+
+    @property
+    def trace_track(self):
+        return self.name
 
     def set_parameters(self):
         """Set parameters for templating."""
@@ -59,15 +69,27 @@ class Deployment(object):
         headend = Headend(self, hypervisors, suffixes)
         self.headend = headend
 
+    @traced
     def create(self):
         """Create a deployment with all configured conductors and routers."""
         suffixes = ['a', 'b']
+        # conductor ip addresses are known from here on, routers can be
+        # initialized while the conductor is still coming up
         self.set_conductor(self.hypervisors_conductor, suffixes)
-        self.conductor.create()
         info('Conductor IP address(es):', ' '.join(self.conductor.ip_adresses))
+        scheduler = Scheduler()
+        conductor_ready = self.conductor.schedule(scheduler)
 
         if 'headend' in self.parameters:
             self.set_headend(self.hypervisors_headend, suffixes)
-            self.headend.create()
+            # the headend is configured through the conductor
+            self.headend.schedule(scheduler, configure_requires=[conductor_ready])
+
+        try:
+            scheduler.run()
+        except NoNodeDeployedException as e:
+            info('No', e, 'node has been deployed.')
+        finally:
+            close_ssh_masters()
         #branch = Branch(self)
         #self.branches.append(branch)
@@ -0,0 +1,63 @@
+"""Journal of completed deployment steps."""
+import json
+import os
+import threading
+import time
+
+from lib.log import fatal, info
+
+
+class Journal(object):
+    """Steps completed per node and router, kept in a JSON file.
+
+    When a deployment is created again, completed steps are verified and
+    skipped instead of being done again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as fd:
+                self.steps = json.load(fd)
+        except FileNotFoundError:
+            self.steps = {}
+
+    def record(self, name, step, **data):
+        """Record step as completed for the node or router name."""
+        data['time'] = time.time()
+        with self._lock:
+            self.steps.setdefault(name, {})[step] = data
+            self.save()
+
+    def completed(self, name, step, verify=None, **expected):
+        """Return the data recorded for step, None if it is not completed.
+
+        A step recorded with other values than expected, e.g. with the hash
+        of another config, is not completed either and has to be done again.
+        verify is called with the data to check that the step still holds,
+        there is no way back if it does not.
+        """
+        with self._lock:
+            data = self.steps.get(name, {}).get(step)
+        if data is None:
+            return None
+        if any(data.get(key) != value for key, value in expected.items()):
+            info('Doing step "{}" of {} again, its input has changed.'.format(
+                step, name))
+            return None
+        if verify is not None and not verify(data):
+            fatal('Step "{}" of {} was completed before, but does not hold'
+                  ' anymore. Remove it from {} to do it again.'.format(
+                      step, name, self.path))
+        info('Skipping step "{}" of {}, it was completed before.'.format(
+            step, name))
+        return data
+
+    def save(self):
+        # called with the lock held, replace the file in one go so that an
+        # interrupted deployment never leaves half of it behind
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as fd:
+            json.dump(self.steps, fd, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -1,9 +1,12 @@
 """Class for virtual machine nodes."""
+import hashlib
 import json
 from openssh_wrapper import SSHError
 import time
 
-from lib.log import debug, fatal
+from lib.log import debug, fatal, info
+from lib.readiness import BOOT_TIMEOUT, wait_for_ssh, wait_until
+from lib.trace import traced
 from lib.vm import VM
 
 
@@ -22,8 +25,14 @@ class Node(VM):
         self.hypervisor = hypervisor
         self.suffix = suffix
         self.is_secondary = False
+        self.deployed = False
+        self.journal = router.journal
         self.set_parameters()
 
+    @property
+    def trace_track(self):
+        return self.name
+
     def set_parameters(self):
         """Set parameters for templating."""
         self.role = self.router.default_node_role
@@ -40,12 +49,14 @@ class Node(VM):
         self.set_passwords(self.router.parameters['passwords'])
         self.set_ssh_keys(self.router.parameters['ssh_keys'])
 
+    @traced
     def install_license(self):
         """Copy license file to conductor."""
         self.run_ssh('mkdir /etc/pki/128technology')
         self.run_scp(self.router.deployment.license_file,
                      '/etc/pki/128technology/release.pem')
 
+    @traced
     def init_iso_instance(self):
         """Run commands to initialize cloned instance."""
         bash_history = 't128-salt-key -L\njournalctl -fu 128T\ncat /etc/salt/minion'
@@ -58,25 +69,34 @@ class Node(VM):
             'systemctl start getty@tty1.service',
             'echo "{}" > /root/.bash_history'.format(bash_history),
         )
-        timeout = 20
-        while True:
-            try:
-                ret = self.run_ssh('uptime')
-                debug('Output of uptime:', ret)
-                if ret.returncode == 0:
-                    break
-            except SSHError:
-                debug('Running "uptime" has failed.',
-                      'Waiting {} seconds.'.format(timeout))
-            finally:
-                # wait for ssh server to be ready
-                time.sleep(timeout)
-                if timeout >= 10:
-                    timeout = int(timeout / 2)
+        started = time.time()
+        deadline = started + BOOT_TIMEOUT
+        waited = wait_for_ssh(self.ip_address, deadline)
+        if waited is None:
+            fatal('No ssh server on {} after {} seconds.'.format(
+                self.name, BOOT_TIMEOUT))
+        # sshd may be up before cloud-init has installed the root key
+        if not wait_until(self.can_login, deadline):
+            fatal('Cannot log in to {} after {} seconds.'.format(
+                self.name, BOOT_TIMEOUT))
+        info('{} is reachable: ssh server after {:.1f}s,'.format(
+            self.name, waited), 'login after {:.1f}s'.format(
+            time.time() - started))
 
         debug('Adjusting VM...')
         self.run_ssh(commands)
 
+    def can_login(self):
+        """Return whether commands can be run over ssh."""
+        try:
+            ret = self.run_ssh('uptime')
+        except SSHError as e:
+            debug('Running "uptime" has failed:', e)
+            return False
+        debug('Output of uptime:', ret)
+        return ret.returncode == 0
+
+    @traced
     def generate_t128_id_rsa(self):
         """Generate ssh key needed for initialize128t."""
         ret = self.run_ssh([
@@ -85,6 +105,7 @@ class Node(VM):
         ])
         self.t128_id_rsa_key = ret.stdout.decode('ascii')
 
+    @traced
     def set_initialize128t_parameters(self):
         """Define the parameters as needed by initialize128t."""
         self.init = {
@@ -114,6 +135,7 @@ class Node(VM):
             for i, ip in enumerate(self.router.deployment.conductor.ip_adresses):
                 self.init['conductor'][keys[i]] = {'ip': ip}
 
+    @traced
     def initialize_128t(self):
         """Initialize 128T."""
         preferences_command = "echo '{}' > /root/128t_preferences.json".format(
@@ -126,6 +148,7 @@ class Node(VM):
             'systemctl start 128T',
         ])
 
+    @traced
     def change_passwords(self):
         """Change passwords of specified users."""
         commands = []
@@ -136,6 +159,7 @@ class Node(VM):
                 "echo '{}:{}' | chpasswd -e".format(user, password))
         ret = self.run_ssh(commands)
 
+    @traced
     def copy_ssh_keys(self):
         """Copy ssh keys for specified users."""
         commands = []
@@ -148,6 +172,17 @@ class Node(VM):
                     user, ssh_key, user))
         ret = self.run_ssh(commands)
 
+    def has_ssh_keys(self):
+        """Return whether the ssh keys of all users are authorized."""
+        commands = [
+            'grep -qF "{}" ~{}/.ssh/authorized_keys'.format(
+                ssh_key.strip(), user)
+            for user, ssh_key in self.ssh_keys.items() if user != 'netconf']
+        if not commands:
+            return True
+        return self.run_ssh(' && '.join(commands)).returncode == 0
+
+    @traced
     def retrieve_pdc_ssh_key(self):
         """Copy pdc pub key from 128T."""
         ret = self.run_ssh([
@@ -155,6 +190,44 @@ class Node(VM):
         ])
         self.pdc_ssh_key = ret.stdout.decode('ascii')
 
+    @traced
+    def prepare_conductor(self):
+        """Install the license and prepare netconf on a deployed node."""
+        if not self.deployed:
+            return
+        if not self.journal.completed(self.name, 'licensed',
+                                      self.has_license):
+            self.install_license()
+            self.journal.record(self.name, 'licensed')
+        key_hash = hashlib.sha256(
+            self.get_netconf_keys()[0].encode()).hexdigest()
+        if self.journal.completed(self.name, 'netconf ready',
+                                  self.has_netconf_key, key_hash=key_hash):
+            self.router.netconf_key = self.get_netconf_keys()[1]
+        else:
+            self.prepare_netconf()
+            self.journal.record(self.name, 'netconf ready', key_hash=key_hash)
+
+    def has_license(self, data=None):
+        """Return whether the license file is in place."""
+        return self.run_ssh(
+            'test -s /etc/pki/128technology/release.pem').returncode == 0
+
+    def has_netconf_key(self, data=None):
+        """Return whether the netconf key is authorized for admin."""
+        return self.run_ssh(
+            'grep -qF "{}" /home/admin/.ssh/netconf_authorized_keys'.format(
+                self.get_netconf_keys()[0].strip())).returncode == 0
+
+    def get_netconf_keys(self):
+        """Return public key and private key file for netconf."""
+        # load ssh key for netconf - if not defined, fall back to root
+        if self.ssh_keys.get('netconf'):
+            return (self.ssh_keys['netconf'],
+                    self.ssh_keys_private.get('netconf'))
+        return self.ssh_keys['root'], self.ssh_keys_private.get('root')
+
+    @traced
     def prepare_netconf(self):
         """Run commands in order to prepare the netconf interface."""
         # This should be triggered on conuctor nodes only
@@ -163,12 +236,8 @@ class Node(VM):
 
         debug('Run prepare_netconf')
 
-        # load ssh key for netconf - if not defined, fall back to root
-        netconf_authorized_keys = self.ssh_keys.get('netconf')
-        self.router.netconf_key = self.ssh_keys_private.get('netconf')
-        if not netconf_authorized_keys:
-            netconf_authorized_keys = self.ssh_keys['root']
-            self.router.netconf_key = self.ssh_keys_private.get('root')
+        netconf_authorized_keys, self.router.netconf_key = \
+            self.get_netconf_keys()
 
         ret = self.run_ssh([
             'while [ ! -s /home/admin/.ssh/netconf_authorized_keys ]; do sleep 5; done',
@@ -176,16 +245,74 @@ class Node(VM):
                 netconf_authorized_keys)
         ])
 
-    def deploy(self):
-        """Deploy a node on the hypervisor."""
+    def is_reachable(self, data=None, timeout=60):
+        """Return whether the node can be logged in to within timeout."""
+        deadline = time.time() + timeout
+        return (wait_for_ssh(self.ip_address, deadline) is not None and
+                wait_until(self.can_login, deadline))
+
+    def is_set_up(self, data):
+        """Return whether the ssh keys are still authorized and the pdc key
+        is the one recorded."""
+        ret = self.run_ssh('cat /etc/128technology/ssh/pdc_ssh_key.pub')
+        return (ret.returncode == 0 and
+                ret.stdout.decode('ascii') == data['pdc_ssh_key'] and
+                self.has_ssh_keys())
+
+    def is_initialized(self, data=None):
+        """Return whether 128T has been initialized."""
+        return self.run_ssh('systemctl is-enabled 128T').returncode == 0
+
+    @traced
+    def deploy_vm(self):
+        """Clone and boot the node on the hypervisor."""
+        if self.journal.completed(self.name, 'booted', self.is_reachable):
+            self.deployed = True
+            return
         debug('Deploying node:', self.name)
-        success = self.hypervisor.deploy_vm(
+        self.deployed = self.hypervisor.deploy_vm(
             self, self.router.deployment.assume_yes)
-        if success:
-            self.set_initialize128t_parameters()
-            self.initialize_128t()
-            self.retrieve_pci_addresses()
-            self.change_passwords()
-            self.copy_ssh_keys()
-            self.retrieve_pdc_ssh_key()
-        return success
+        if self.deployed:
+            self.journal.record(self.name, 'booted')
+
+    @traced
+    def initialize(self):
+        """Initialize 128T on a deployed node."""
+        if not self.deployed or self.journal.completed(
+                self.name, 'initialized', self.is_initialized):
+            return
+        self.set_initialize128t_parameters()
+        self.initialize_128t()
+        self.journal.record(self.name, 'initialized')
+
+    @traced
+    def set_up(self):
+        """Set up users and retrieve the node details after initialization."""
+        if not self.deployed:
+            return
+        keys_hash = hashlib.sha256(json.dumps(
+            self.ssh_keys, sort_keys=True).encode()).hexdigest()
+        data = self.journal.completed(self.name, 'set up', self.is_set_up,
+                                      keys_hash=keys_hash)
+        if data:
+            for interface, pci_address in data['pci_addresses'].items():
+                self.interfaces[interface]['pci_address'] = pci_address
+            self.pdc_ssh_key = data['pdc_ssh_key']
+            return
+        self.retrieve_pci_addresses()
+        self.change_passwords()
+        self.copy_ssh_keys()
+        self.retrieve_pdc_ssh_key()
+        pci_addresses = dict(
+            (interface, details['pci_address'])
+            for interface, details in self.interfaces.items()
+            if 'pci_address' in details)
+        self.journal.record(self.name, 'set up', pci_addresses=pci_addresses,
+                            pdc_ssh_key=self.pdc_ssh_key, keys_hash=keys_hash)
+
+    def deploy(self):
+        """Deploy a node on the hypervisor."""
+        self.deploy_vm()
+        self.initialize()
+        self.set_up()
+        return self.deployed
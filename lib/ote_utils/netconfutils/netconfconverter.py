@@ -2,16 +2,109 @@
 Library for converting a running configuration to Netconf XML.
 """
 
+from collections import OrderedDict
+import copy
+import hashlib
+import marshal
+import os
+
 from lxml import etree
 
 import yinsolidated
 
 
+NETCONF_NAMESPACE = 'urn:ietf:params:xml:ns:netconf:base:1.0'
+DATA_KEYWORDS = ('container', 'list', 'leaf', 'leaf-list', 'choice', 'case')
+SCHEMA_KEYWORDS = ('choice', 'case')
+# operations of the wanted config which are passed on to the edit as is
+EXPLICIT_OPERATIONS = ('delete', 'remove', 'create', 'replace')
+
+# bump whenever the layout of the serialized model cache changes
+MODEL_CACHE_FORMAT = 3
+MODEL_CACHE_FILE = '.netconfconverter-{}.cache'
+
 
 class ConfigParseError(RuntimeError):
 
     "Exception class for errors while parsing configuration"
 
+
+class ModelNode(object):
+
+    """
+    Compiled view of a single data node of the consolidated model. Children
+    of choice and case statements are hoisted into the nearest data node, so
+    resolving a config token is a single dictionary lookup on its parent.
+    """
+    __slots__ = ('name', 'namespace', 'prefix', 'keyword', 'keys', 'tag',
+                 'children')
+
+    def __init__(self, name, namespace, prefix, keyword, keys=()):
+        self.name = name
+        self.namespace = namespace
+        self.prefix = prefix
+        self.keyword = keyword
+        self.keys = keys
+        self.tag = str(etree.QName(namespace, name)) if name else None
+        self.children = {}
+
+
+class _XmlFileBuilder(object):
+
+    """
+    Minimal etree.TreeBuilder look-alike writing to an etree.xmlfile. The
+    element returned by start() is held back until the next event, so
+    attributes can still be set on it and leaves are written in one go.
+    """
+
+    def __init__(self, xf):
+        self.xf = xf
+        self.open_elements = []
+        self.pending = None
+        self.pending_nsmap = None
+        self.pending_text = []
+
+    def start(self, tag, attrib, nsmap=None):
+        self._open_pending()
+        self.pending = etree.Element(tag, attrib)
+        self.pending_nsmap = nsmap or {}
+        self.pending_text = []
+        return self.pending
+
+    def data(self, data):
+        if self.pending is not None:
+            self.pending_text.append(data)
+        elif self.open_elements:
+            self.xf.write(data)
+
+    def end(self, tag):
+        self._open_pending()
+        context, _ = self.open_elements.pop()
+        context.__exit__(None, None, None)
+
+    def close(self):
+        if self.pending is not None or self.open_elements:
+            raise Exception('Missing exit, {} element(s) still open'.format(
+                len(self.open_elements) + (self.pending is not None)))
+
+    def _open_pending(self):
+        if self.pending is None:
+            return
+
+        # only declare namespaces not already in scope, like tostring() does
+        scope = self.open_elements[-1][1] if self.open_elements else {}
+        nsmap = dict((prefix, ns) for prefix, ns in self.pending_nsmap.items()
+                     if scope.get(prefix) != ns)
+        context = self.xf.element(self.pending.tag, dict(self.pending.attrib),
+                                  nsmap=nsmap or None)
+        context.__enter__()
+        scope = dict(scope)
+        scope.update(nsmap)
+        self.open_elements.append((context, scope))
+        self.pending = None
+        self.xf.write(''.join(self.pending_text))
+
+
 class NetconfConverter(object):
 
     """
@@ -19,20 +112,39 @@ class NetconfConverter(object):
     """
     YIN_NAMESPACE = 'urn:ietf:params:xml:ns:yang:yin:1'
     IDENTITY_TAG = str(etree.QName(YIN_NAMESPACE, 'identity'))
-    IDENTITY_MAP = {}
     operation_elem_name = etree.QName(
         'urn:ietf:params:xml:ns:netconf:base:1.0',
         'operation')
 
-    def load_config_model(self, config_model_file):
+    def __init__(self):
+        # identities of the config model, per instance since converters
+        # for several model versions can be loaded at the same time
+        self.identities = {}
+
+    def load_config_model(self, config_model_file, use_cache=False):
         """
         Parses the specified Netconf xml Consolidated Config Model file
 
+        When use_cache is set, the compiled model and identity map are stored
+        next to the model file, keyed by the SHA-256 of its content. Loading
+        the same model again skips XML parsing, in which case self.model is
+        None.
+
         Args:
             config_model_file (str): Consolidated model Config xml file
+            use_cache (bool): reuse (or create) the compiled model cache
         """
+        cache_file = None
+        if use_cache:
+            cache_file = self._get_model_cache_file(config_model_file)
+        if cache_file and self._load_model_cache(cache_file):
+            return
+
         self.model = yinsolidated.parse(config_model_file)
         self._find_identities()
+        self._compile_model()
+        if cache_file:
+            self._save_model_cache(cache_file)
 
     def load_user_model(self, user_model_file):
         """
@@ -42,6 +154,7 @@ class NetconfConverter(object):
             config_model_file (str): Consolidated model User xml file
         """
         self.model = yinsolidated.parse(user_model_file)
+        self._compile_model()
 
     def convert_config_to_netconf_xml(self, config_string_or_list, tag, attributes={}):
         """
@@ -63,9 +176,121 @@ class NetconfConverter(object):
 
         return self._convert_config_list_to_netconf_xml(config_list, tag, attributes)
 
-    def _convert_config_list_to_netconf_xml(self, config_list, tag, attributes):
+    def write_config_as_netconf_xml(self, config_text, output, tag, attributes={}):
+        """
+        Streaming variant of convert_config_to_netconf_xml. The config is read
+        from an iterable of text, e.g. a file object or the generator returned
+        by a jinja2 Template.generate(), and the Netconf XML is serialized to
+        the binary file-like object output while it is being read. Only the
+        currently open elements are kept in memory.
 
+        Args:
+            config_text (iterable): Text chunks containing the config lines
+            output (file): Binary file-like object receiving the xml
+            tag (str): custom tag to add to xml block
+            attributes (str): custom attr of starting tags in built netconf
+        """
+        with etree.xmlfile(output) as xf:
+            builder = _XmlFileBuilder(xf)
+            self._build_netconf_xml(builder, self._iter_config_lines(config_text),
+                                    tag, attributes)
+
+    def convert_netconf_xml_to_config(self, config_xml):
+        """
+        Converts Netconf XML back to a running configuration, the reverse of
+        convert_config_to_netconf_xml. The model decides whether an element
+        is a leaf or an object and which leaves are list keys, identity
+        prefixes are stripped from values.
+
+        Args:
+            config_xml (Element/str/GetReply): the data of a get-config reply,
+                a Netconf config element or the t128 config element itself
+
+        Returns:
+            str: the config, one command per line
+        """
+        lines = []
+        for element in self._find_config_elements(config_xml):
+            self._convert_element_to_config(element, self.model_root, lines)
+        return '\n'.join(lines) + '\n'
+
+    def diff_netconf_xml(self, running_xml, config_xml, tag='config',
+                         prune=False):
+        """
+        Computes the edit-config needed to turn running_xml into config_xml.
+        Elements are matched using the model, list entries by their keys.
+        Added or changed subtrees are annotated with operation="merge",
+        removed ones with operation="delete". Elements of config_xml which
+        carry a delete, remove, create or replace operation already are
+        copied to the edit unchanged.
+
+        config_xml is taken as a partial config: elements of running_xml it
+        does not mention are left alone. With prune set, everything below a
+        list entry config_xml mentions is considered complete instead, and
+        whatever else running_xml has there is deleted. Elements of
+        running_xml the model does not know are left alone, unless they
+        would have to be deleted, which raises ConfigParseError.
+
+        Args:
+            running_xml (Element/str/GetReply): the current config, e.g. the
+                data of a get-config reply
+            config_xml (Element/str): the wanted config, e.g. as returned by
+                convert_config_to_netconf_xml
+            tag (str): custom tag to add to xml block
+            prune (bool): delete what list entries of config_xml lack
+
+        Returns:
+            Element: the edit-config payload or None if nothing changed
+        """
+        changes = self._diff_children(
+            self._find_config_elements(running_xml),
+            self._find_config_elements(config_xml),
+            self.model_root, prune, False)
+        if not changes:
+            return None
+
+        root = etree.Element(etree.QName(NETCONF_NAMESPACE, tag))
+        root.extend(changes)
+        return root
+
+    def build_netconf_filter(self, config_xml):
+        """
+        Builds a subtree filter selecting everything config_xml may touch,
+        i.e. the path down to each outermost list entry, which is selected
+        by its keys. The running config fetched with it is sufficient for
+        diff_netconf_xml.
+
+        Args:
+            config_xml (Element/str): the config to build the filter for
+
+        Returns:
+            Element: a Netconf subtree filter
+        """
+        root = etree.Element(etree.QName(NETCONF_NAMESPACE, 'filter'),
+                             type='subtree')
+        for element in self._find_config_elements(config_xml):
+            root.append(self._build_filter_element(element, self.model_root))
+        return root
+
+    def _find_config_elements(self, config_xml):
+        config_xml = getattr(config_xml, 'data_ele', config_xml)
+        if isinstance(config_xml, str):
+            config_xml = config_xml.encode()
+        if isinstance(config_xml, bytes):
+            config_xml = etree.fromstring(config_xml)
+
+        # skip wrappers like <data> or <config> of the base namespace
+        qname = etree.QName(config_xml)
+        node = self.model_root.children.get(qname.localname)
+        if node is not None and node.namespace == qname.namespace:
+            return [config_xml]
+        return list(config_xml.iterchildren(tag=etree.Element))
+
+    def _convert_config_list_to_netconf_xml(self, config_list, tag, attributes):
         builder = etree.TreeBuilder()
+        return self._build_netconf_xml(builder, config_list, tag, attributes)
+
+    def _build_netconf_xml(self, builder, config_list, tag, attributes):
         config_elem_name = etree.QName(
             'urn:ietf:params:xml:ns:netconf:base:1.0',
             tag)
@@ -114,65 +339,54 @@ class NetconfConverter(object):
             self._process_config_tokens(builder, stack, tokens)
 
     def _process_config_tokens(self, builder, stack, tokens, operation=None):
-        first_token = tokens[0]
-        ns, prefix, yang_keyword = self._find_model_node(stack, first_token)
-        element_name = etree.QName(ns, first_token)
+        node = self._find_model_node(stack, tokens[0])
 
         self._add_indent(builder, stack)
-        elem = builder.start(element_name, {}, {prefix:ns})
+        elem = builder.start(node.tag, {}, {node.prefix: node.namespace})
 
         if operation == 'delete':
             elem.set(NetconfConverter.operation_elem_name, 'delete')
         elif operation == 'create':
             elem.set(NetconfConverter.operation_elem_name, 'create')
 
-        if yang_keyword in ['leaf','leaf-list','case']:
-            if self._is_identity_type(tokens[1], ns):
-                tokens[1] = prefix + ':' + tokens[1]
+        if node.keyword in ['leaf','leaf-list','case']:
+            if self._is_identity_type(tokens[1], node.namespace):
+                tokens[1] = node.prefix + ':' + tokens[1]
             builder.data(' '.join(tokens[1:]))
-            builder.end(element_name)
+            builder.end(node.tag)
             builder.data('\n')
         else:
-            stack.append(first_token)
+            stack.append(node)
             builder.data('\n')
 
     def _find_model_node(self, stack, token):
-        stack_copy = list(stack)
-        if token is not None:
-            stack_copy.append(token)
-        tree = self.model.getroot()
-
-        for name in stack_copy:
-            tree = self.find_child(tree, name)
-
-        if tree is None:
-            raise Exception('Token {} does not exist in the data model'.format(token))
-
-        return tree.namespace, tree.prefix, etree.QName(tree.tag).localname
-
-    def find_child(self, tree, name):
-        node = tree.find("*/[@name='{}']".format(name))
+        parent = stack[-1] if stack else self.model_root
+        node = parent.children.get(token)
         if node is None:
-            for child in tree:
-                if etree.QName(child.tag).localname in ['choice', 'case']:
-                    node = self.find_child(child, name)
-                    if node is not None:
-                        return node
+            raise Exception('Token {} does not exist in the data model'.format(token))
         return node
 
     def _process_exit_token(self, builder, stack):
-        token = stack[-1]
-        ns, _, _ = self._find_model_node(stack, None)
-        element_name = etree.QName(ns, token)
-        stack.pop()
+        node = stack.pop()
         self._add_indent(builder, stack)
-        builder.end(element_name)
+        builder.end(node.tag)
         builder.data('\n')
 
     def _convert_config_string_to_list(self, config_str):
         lines = config_str.splitlines()
         return [line.strip() for line in lines]
 
+    def _iter_config_lines(self, config_text):
+        if isinstance(config_text, str):
+            config_text = (config_text,)
+        rest = ''
+        for chunk in config_text:
+            lines = (rest + chunk).split('\n')
+            rest = lines.pop()
+            for line in lines:
+                yield line.strip()
+        yield rest.strip()
+
     def _is_line_empty_or_comment(self, config_line):
         return (len(config_line) == 0) or (config_line[0] == '#')
 
@@ -180,15 +394,249 @@ class NetconfConverter(object):
         indent = len(stack) * '    '
         builder.data(indent)
 
+    def _compile_model(self):
+        """
+        Builds the node tree for the loaded model. Every data node is
+        compiled once into a ModelNode, with choice and case statements
+        flattened away.
+        """
+        self._data_tags = tuple(str(etree.QName(self.YIN_NAMESPACE, keyword))
+                                for keyword in DATA_KEYWORDS)
+        self.model_root = self._compile_node(self.model.getroot())
+
+    def _compile_node(self, element):
+        keyword = etree.QName(element.tag).localname
+        # lxml attribute values keep their element alive, store plain strings
+        keys = ()
+        if keyword == 'list':
+            keys = tuple(str(name) for name, _ in element.key_ids)
+        node = ModelNode(str(element.get('name')), str(element.namespace),
+                         str(element.prefix), keyword, keys)
+
+        hoisted = []
+        for child in element.iterchildren(*self._data_tags):
+            child_node = self._compile_node(child)
+            node.children.setdefault(child_node.name, child_node)
+            if child_node.keyword in SCHEMA_KEYWORDS:
+                hoisted.append(child_node)
+
+        # direct children take precedence over the ones found below a
+        # choice or case, the first match in document order wins
+        for child_node in hoisted:
+            for name, grandchild in child_node.children.items():
+                node.children.setdefault(name, grandchild)
+        return node
+
+    def _get_model_cache_file(self, config_model_file):
+        # file objects are accepted as well, as long as they live on disk
+        path = getattr(config_model_file, 'name', config_model_file)
+        if not isinstance(path, str) or not os.path.isfile(path):
+            return None
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as fd:
+            for chunk in iter(lambda: fd.read(1 << 20), b''):
+                digest.update(chunk)
+        return os.path.join(os.path.dirname(os.path.abspath(path)),
+                            MODEL_CACHE_FILE.format(digest.hexdigest()))
+
+    def _save_model_cache(self, cache_file):
+        # flatten the node graph into a table, children refer to row numbers
+        rows = {}
+        table = []
+        pending = [self.model_root]
+        while pending:
+            node = pending.pop()
+            if id(node) in rows:
+                continue
+            rows[id(node)] = len(table)
+            table.append(node)
+            pending.extend(node.children.values())
+
+        nodes = tuple(
+            (node.name, node.namespace, node.prefix, node.keyword, node.keys,
+             tuple((name, rows[id(child)])
+                   for name, child in node.children.items()))
+            for node in table)
+        data = marshal.dumps((MODEL_CACHE_FORMAT, nodes, self.identities))
+
+        # write atomically, a model directory may be shared by several
+        # processes and a read-only one simply means no cache
+        tmp_file = '{}.{}'.format(cache_file, os.getpid())
+        try:
+            with open(tmp_file, 'wb') as fd:
+                fd.write(data)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass
+
+    def _load_model_cache(self, cache_file):
+        try:
+            with open(cache_file, 'rb') as fd:
+                version, nodes, identities = marshal.loads(fd.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+        if version != MODEL_CACHE_FORMAT:
+            return False
+
+        table = [ModelNode(*row[:5]) for row in nodes]
+        for node, row in zip(table, nodes):
+            for name, child in row[5]:
+                node.children[name] = table[child]
+
+        self.model = None
+        self.model_root = table[0]
+        self.identities = identities
+        return True
+
     def _find_identities(self):
         identities = self.model.findall('/' + self.IDENTITY_TAG)
+        self.identities = {}
         for child in identities:
-            self.IDENTITY_MAP[child.name] = {'prefix' : child.prefix, 'namespace' : child.namespace}
+            self.identities[str(child.name)] = {'prefix' : str(child.prefix), 'namespace' : str(child.namespace)}
+
+    def _convert_element_to_config(self, element, parent, lines, depth=0):
+        node = self._find_element_node(element, parent)
+        name = node.name
+
+        indent = depth * '    '
+        if node.keyword in ['leaf','leaf-list','case']:
+            value = self._format_config_value(element)
+            lines.append((indent + name + ' ' + value).rstrip())
+            return
+
+        tokens = [name]
+        for key in node.keys:
+            for child in element.iterchildren(tag=etree.Element):
+                if etree.QName(child).localname == key:
+                    tokens.append(self._format_config_value(child))
+                    break
+        lines.append(indent + ' '.join(tokens))
+        for child in element.iterchildren(tag=etree.Element):
+            self._convert_element_to_config(child, node, lines, depth + 1)
+        lines.append(indent + 'exit')
+
+    def _find_element_node(self, element, parent):
+        node = parent.children.get(etree.QName(element).localname)
+        if node is None:
+            raise ConfigParseError(
+                'Element {} does not exist in the data model'.format(element.tag))
+        return node
+
+    def _index_children(self, elements, parent, skip_unknown=False):
+        children = OrderedDict()
+        for element in elements:
+            if (skip_unknown and
+                    parent.children.get(etree.QName(element).localname) is None):
+                continue
+            node = self._find_element_node(element, parent)
+            if node.keyword == 'list':
+                key = (node.name, tuple(
+                    self._format_config_value(self._copy_key_element(element, name))
+                    for name in node.keys))
+            elif node.keyword == 'leaf-list':
+                key = (node.name, self._format_config_value(element))
+            else:
+                key = node.name
+            children[key] = (element, node)
+        return children
+
+    def _copy_key_element(self, element, key):
+        for child in element.iterchildren(tag=etree.Element):
+            if etree.QName(child).localname == key:
+                child = copy.deepcopy(child)
+                child.tail = None
+                return child
+        raise ConfigParseError('Element {} is missing its key {}'.format(
+            element.tag, key))
+
+    def _diff_children(self, running, config, parent, prune, delete_missing):
+        # running config the model does not know is left alone, unless it
+        # would have to be deleted
+        running = self._index_children(running, parent,
+                                       skip_unknown=not delete_missing)
+        config = self._index_children(config, parent)
+
+        changes = []
+        for key, (element, node) in config.items():
+            if (element.get(NetconfConverter.operation_elem_name) in
+                    EXPLICIT_OPERATIONS):
+                changes.append(self._copy_for_edit(element))
+            elif key not in running:
+                changes.append(self._copy_for_edit(element, 'merge'))
+            elif node.keyword in ['leaf','leaf-list','case']:
+                if (self._format_config_value(element) !=
+                        self._format_config_value(running[key][0])):
+                    changes.append(self._copy_for_edit(element, 'merge'))
+            else:
+                # when pruning, the config below a list entry is complete
+                change = self._diff_element(
+                    running[key][0], element, node, prune,
+                    delete_missing or (prune and node.keyword == 'list'))
+                if change is not None:
+                    changes.append(change)
+
+        if delete_missing:
+            for key, (element, node) in running.items():
+                if key not in config:
+                    changes.append(self._build_delete_element(element, node))
+        return changes
+
+    def _diff_element(self, running, config, node, prune, delete_missing):
+        changes = self._diff_children(running.iterchildren(tag=etree.Element),
+                                      config.iterchildren(tag=etree.Element),
+                                      node, prune, delete_missing)
+        if not changes:
+            return None
+
+        element = etree.Element(node.tag, nsmap={node.prefix: node.namespace})
+        for key in node.keys:
+            element.append(self._copy_key_element(config, key))
+        element.extend(changes)
+        return element
+
+    def _copy_for_edit(self, element, operation=None):
+        element = copy.deepcopy(element)
+        element.tail = None
+        if operation:
+            element.set(NetconfConverter.operation_elem_name, operation)
+        return element
+
+    def _build_delete_element(self, running, node):
+        element = etree.Element(node.tag, nsmap={node.prefix: node.namespace})
+        element.set(NetconfConverter.operation_elem_name, 'delete')
+        if node.keyword == 'leaf-list':
+            element.text = running.text
+        for key in node.keys:
+            element.append(self._copy_key_element(running, key))
+        return element
+
+    def _build_filter_element(self, config, parent):
+        node = self._find_element_node(config, parent)
+        element = etree.Element(node.tag, nsmap={node.prefix: node.namespace})
+        if node.keyword == 'list':
+            # content match nodes select the whole list entry
+            for key in node.keys:
+                element.append(self._copy_key_element(config, key))
+        elif node.keyword not in ['leaf','leaf-list','case']:
+            for child in config.iterchildren(tag=etree.Element):
+                element.append(self._build_filter_element(child, node))
+        return element
+
+    def _format_config_value(self, element):
+        value = (element.text or '').strip()
+        prefix, _, token = value.rpartition(':')
+        if prefix and element.nsmap.get(prefix) is not None:
+            if self._is_identity_type(token, element.nsmap[prefix]):
+                value = token
+        if len(value.split()) > 1:
+            value = '"' + value + '"'
+        return value
 
     def _is_identity_type(self, token, namespace):
         is_identity = False
         try:
-            if self.IDENTITY_MAP[token]['namespace'] == namespace:
+            if self.identities[token]['namespace'] == namespace:
                 is_identity = True
         except KeyError: pass
         return is_identity
@@ -0,0 +1,271 @@
+from io import BytesIO
+import os
+
+import jinja2
+from lxml import etree
+import pytest
+
+from ote_utils.netconfutils.netconfconverter import (ConfigParseError,
+                                                     NetconfConverter)
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        '..', '..', '..', '..')
+MODEL_FILE = os.path.join(REPO_DIR, 'consolidatedT128Model.xml')
+TEMPLATE_DIR = os.path.join(REPO_DIR, 'config_templates')
+NC = '{urn:ietf:params:xml:ns:netconf:base:1.0}'
+AUTHY = '{http://128technology.com/t128/config/authority-config}'
+SYS = '{http://128technology.com/t128/config/system-config}'
+
+converter = NetconfConverter()
+converter.load_config_model(MODEL_FILE)
+
+
+def interfaces(index):
+    return {
+        'wan': {'pci_address': '0000:00:12.0', 'ip_prefix': 24,
+                'ip_address': '192.0.2.{}'.format(10 + index),
+                'gateway': '192.0.2.1'},
+        'ha_sync': {'pci_address': '0000:00:13.0', 'ip_prefix': 30,
+                    'ip_address': '198.51.100.{}'.format(10 + index)},
+        'lan': {'pci_address': '0000:00:14.0', 'ip_prefix': 24,
+                'ip_address': '10.0.0.{}'.format(index)},
+    }
+
+
+# variables of all sample templates
+CONTEXT = {
+    'router': {
+        'name': 'r1',
+        'location': 'Berlin',
+        'gps': '+52.5200+013.4050/',
+        'nodes': [{'name': 'r1-node{}'.format(index),
+                   'fqdn': 'r1-node{}.example.com'.format(index),
+                   'interfaces': interfaces(index)} for index in (1, 2)],
+    },
+    'customer': 'acme',
+    'site_no': 1,
+    'deployment': {'name': 'lab'},
+    'lan_router_address': '10.1.0.1',
+    'lan_network_address': '10.1.0.0',
+    'lan_prefix': 24,
+    'location_description': 'Lab',
+    'location_coordinates': '+52.5200+013.4050/',
+    'conductor_node1_public_ip': '203.0.113.1',
+    'conductor_location': 'Berlin',
+    'conductor_gps': '+52.5200+013.4050/',
+}
+TEMPLATES = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATE_DIR))
+
+
+def config(*router_lines):
+    lines = ['config', 'authority', 'router r1', 'name r1']
+    lines.extend(router_lines)
+    lines.extend(['exit', 'exit', 'exit'])
+    return converter.convert_config_to_netconf_xml(lines, 'config')
+
+
+def node(name, role='combo', operation=None):
+    lines = ['node ' + name, 'name ' + name, 'role ' + role, 'exit']
+    if operation:
+        lines[0] = operation + ' ' + lines[0]
+    return lines
+
+
+def router(diff):
+    return diff.find('*/{0}authority/{0}router'.format(AUTHY))
+
+
+def operations(element):
+    return [(etree.QName(child).localname, child.findtext(SYS + 'name'),
+             child.get(NC + 'operation'))
+            for child in element.iterchildren(tag=etree.Element)]
+
+
+def test_identical_trees():
+    running = config(*node('n1'))
+    assert converter.diff_netconf_xml(running, config(*node('n1'))) is None
+
+
+def test_leaf_change():
+    running = config('description old', *node('n1'))
+    diff = converter.diff_netconf_xml(running,
+                                      config('description new', *node('n1')))
+    assert operations(router(diff)) == [
+        ('name', None, None), ('description', None, 'merge')]
+    assert router(diff).findtext(AUTHY + 'description') == 'new'
+
+
+def test_leaf_change_below_list_entry():
+    running = config(*node('n1'))
+    diff = converter.diff_netconf_xml(running, config(*node('n1', 'control')))
+    node_diff = router(diff).find(SYS + 'node')
+    assert node_diff.get(NC + 'operation') is None
+    assert node_diff.findtext(SYS + 'name') == 'n1'
+    role = node_diff.find(SYS + 'role')
+    assert (role.text, role.get(NC + 'operation')) == ('control', 'merge')
+
+
+def test_keyed_list_add():
+    running = config(*node('n1'))
+    diff = converter.diff_netconf_xml(running,
+                                      config(*(node('n1') + node('n2'))))
+    assert operations(router(diff)) == [
+        ('name', None, None), ('node', 'n2', 'merge')]
+
+
+def test_keyed_list_remove_is_kept_by_default():
+    running = config(*(node('n1') + node('n2')))
+    assert converter.diff_netconf_xml(running, config(*node('n1'))) is None
+
+
+def test_keyed_list_remove_with_prune():
+    running = config(*(node('n1') + node('n2')))
+    diff = converter.diff_netconf_xml(running, config(*node('n1')),
+                                      prune=True)
+    assert operations(router(diff)) == [
+        ('name', None, None), ('node', 'n2', 'delete')]
+    # only the keys are needed to delete a list entry
+    assert operations(router(diff).find(SYS + 'node')) == [
+        ('name', None, None)]
+
+
+def test_prune_leaves_other_list_entries_alone():
+    running = config(*node('n1'))
+    extra = etree.SubElement(running.find('*/' + AUTHY + 'authority'),
+                             AUTHY + 'router')
+    etree.SubElement(extra, AUTHY + 'name').text = 'r2'
+    assert converter.diff_netconf_xml(running, config(*node('n1')),
+                                      prune=True) is None
+
+
+def add_unknown_element(running):
+    # e.g. config of a newer software version than the model
+    router_element = router(running)
+    etree.SubElement(router_element, AUTHY + 'unknown-setting').text = 'x'
+    return running
+
+
+def test_unknown_running_element_is_left_alone():
+    running = add_unknown_element(config('description old', *node('n1')))
+    diff = converter.diff_netconf_xml(running,
+                                      config('description new', *node('n1')))
+    assert operations(router(diff)) == [
+        ('name', None, None), ('description', None, 'merge')]
+
+
+def test_unknown_running_element_with_prune():
+    running = add_unknown_element(config(*node('n1')))
+    with pytest.raises(ConfigParseError):
+        converter.diff_netconf_xml(running, config(*node('n1')), prune=True)
+
+
+def test_explicit_delete_of_existing_entry():
+    running = config(*(node('n1') + node('n2')))
+    diff = converter.diff_netconf_xml(
+        running, config(*(node('n1') + node('n2', operation='delete'))))
+    assert operations(router(diff)) == [
+        ('name', None, None), ('node', 'n2', 'delete')]
+    # passed on as written, not diffed
+    assert operations(router(diff).find(SYS + 'node')) == [
+        ('name', None, None), ('role', None, None)]
+
+
+def test_explicit_delete_of_missing_entry():
+    running = config(*node('n1'))
+    diff = converter.diff_netconf_xml(
+        running, config(*(node('n1') + node('n3', operation='delete'))))
+    assert operations(router(diff)) == [
+        ('name', None, None), ('node', 'n3', 'delete')]
+
+
+def test_explicit_create():
+    running = config(*node('n1'))
+    diff = converter.diff_netconf_xml(
+        running, config(*(node('n1') + node('n2', operation='create'))))
+    assert operations(router(diff)) == [
+        ('name', None, None), ('node', 'n2', 'create')]
+
+
+def test_filter_selects_outermost_list_entries():
+    netconf_filter = converter.build_netconf_filter(
+        config('description new', *(node('n1') + node('n2'))))
+    assert netconf_filter.tag == NC + 'filter'
+    assert netconf_filter.get('type') == 'subtree'
+    routers = netconf_filter.findall('*/{0}authority/{0}router'.format(AUTHY))
+    assert len(routers) == 1
+    assert operations(routers[0]) == [('name', None, None)]
+    assert routers[0].findtext(AUTHY + 'name') == 'r1'
+
+
+def test_identities_are_per_model():
+    bgp = 'http://128technology.com/t128/config/bgp-config'
+    assert converter._is_identity_type('mpbgp', bgp)
+    assert not NetconfConverter()._is_identity_type('mpbgp', bgp)
+
+
+@pytest.mark.parametrize('template_name', TEMPLATES.list_templates())
+def test_streaming_matches_tree(template_name):
+    template = TEMPLATES.get_template(template_name)
+    tree = converter.convert_config_to_netconf_xml(
+        template.render(CONTEXT).split('\n'), 'config')
+    output = BytesIO()
+    converter.write_config_as_netconf_xml(template.generate(CONTEXT), output,
+                                          'config')
+    assert output.getvalue() == etree.tostring(tree)
+
+
+def test_streaming_lines_split_over_chunks():
+    text = TEMPLATES.get_template('router.j2').render(CONTEXT)
+    chunks = [text[start:start + 5] for start in range(0, len(text), 5)]
+    output = BytesIO()
+    converter.write_config_as_netconf_xml(chunks, output, 'config')
+    assert output.getvalue() == etree.tostring(
+        converter.convert_config_to_netconf_xml(text, 'config'))
+
+
+def test_streaming_unknown_token():
+    text = 'config\n    authority\n        no-such-thing 1\n    exit\nexit\n'
+    with pytest.raises(ConfigParseError, match='line 3'):
+        converter.write_config_as_netconf_xml(iter([text]), BytesIO(),
+                                              'config')
+
+
+def test_streaming_missing_exit():
+    text = 'config\n    authority\n        router r1\n            name r1\n'
+    with pytest.raises(ConfigParseError, match='Missing exit'):
+        converter.write_config_as_netconf_xml(iter([text]), BytesIO(),
+                                              'config')
+
+
+@pytest.mark.parametrize('template_name', TEMPLATES.list_templates())
+def test_text_config_round_trip(template_name):
+    xml = converter.convert_config_to_netconf_xml(
+        TEMPLATES.get_template(template_name).render(CONTEXT), 'config')
+    text = converter.convert_netconf_xml_to_config(xml)
+    again = converter.convert_config_to_netconf_xml(text, 'config')
+    assert etree.tostring(again) == etree.tostring(xml)
+    assert converter.convert_netconf_xml_to_config(again) == text
+
+
+def test_text_config_of_partial_config():
+    text = converter.convert_netconf_xml_to_config(config(*node('n1')))
+    assert text.split('\n') == [
+        'config',
+        '    authority',
+        '        router r1',
+        '            name r1',
+        '            node n1',
+        '                name n1',
+        '                role combo',
+        '            exit',
+        '        exit',
+        '    exit',
+        'exit',
+        '',
+    ]
+
+
+def test_text_config_unknown_element():
+    running = add_unknown_element(config(*node('n1')))
+    with pytest.raises(ConfigParseError):
+        converter.convert_netconf_xml_to_config(running)
@@ -0,0 +1,59 @@
+"""Wait for virtual machines to become reachable."""
+import random
+import socket
+import time
+
+from lib.log import debug
+
+# seconds a freshly booted node may take until ssh logins work
+BOOT_TIMEOUT = 600
+
+
+def backoff(initial=0.5, maximum=5, factor=2):
+    """Yield exponentially growing delays with jitter.
+
+    Half of each delay is random, so nodes booted at the same time do not
+    probe in lockstep.
+    """
+    delay = initial
+    while True:
+        yield delay / 2 + random.uniform(0, delay / 2)
+        delay = min(delay * factor, maximum)
+
+
+def wait_until(check, deadline, delays=None):
+    """Call check until it returns True or the deadline has passed.
+
+    Returns whether check has succeeded.
+    """
+    if delays is None:
+        delays = backoff()
+    while True:
+        if check():
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(next(delays), remaining))
+
+
+def probe_ssh(host, port=22, timeout=2):
+    """Return whether an ssh server answers with its banner."""
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            banner = sock.recv(256)
+    except OSError as e:
+        debug('No ssh server on {}:{}:'.format(host, port), e)
+        return False
+    return banner.startswith(b'SSH-')
+
+
+def wait_for_ssh(host, deadline, port=22):
+    """Wait until an ssh server answers on host, return the time waited.
+
+    Returns None if there was no answer before the deadline.
+    """
+    started = time.time()
+    if wait_until(lambda: probe_ssh(host, port), deadline):
+        return time.time() - started
+    return None
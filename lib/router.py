@@ -1,15 +1,18 @@
 """Class for 128T routers."""
+import hashlib
 import json
 import tempfile
 
 from lib.log import debug, info
 from lib.node import Node
+from lib.scheduler import Scheduler
+from lib.trace import traced
 from lib.vm import scp_down
 
 import lib.config_template as ct
-from lib.configurator import t128ConfigHelper
-from ncclient.operations.rpc import RPCError
+from lib.configurator import t128ConfigError, t128ConfigHelper
 from lib.ote_utils.netconfutils.netconfconverter import ConfigParseError
+from lxml import etree
 
 
 def generate_router_name(deployment_name, role):
@@ -31,8 +34,13 @@ class Router(object):
         self.suffixes = suffixes
         self.set_parameters()
         self.ip_adresses = []
+        self.journal = deployment.journal
         self.prepare()
 
+    @property
+    def trace_track(self):
+        return self.name
+
     def set_parameters(self):
         """Set parameters for templating."""
         self.role = self.__class__.__name__.lower()
@@ -63,24 +71,71 @@ class Router(object):
                 if i == 1:
                     node.is_secondary = True
 
+    @traced
     def sync_pdc_ssh_keys(self):
         """Sync public keys between nodes."""
-        pdc_ssh_keys = '\n'.join([node.pdc_ssh_key for node in self.nodes])
+        nodes = [node for node in self.nodes if node.deployed]
+        if not nodes:
+            raise NoNodeDeployedException(self.role)
+        pdc_ssh_keys = '\n'.join([node.pdc_ssh_key for node in nodes])
+        keys_hash = hashlib.sha256(pdc_ssh_keys.encode()).hexdigest()
+        if self.journal.completed(
+                self.name, 'keys synced',
+                lambda data: self.has_pdc_ssh_keys(nodes, pdc_ssh_keys),
+                keys_hash=keys_hash):
+            return
         copy_cmd = "echo '{}' > /etc/128technology/ssh/authorized_keys".format(
             pdc_ssh_keys)
-        for node in self.nodes:
+        for node in nodes:
             node.run_ssh(copy_cmd)
+        self.journal.record(self.name, 'keys synced', keys_hash=keys_hash)
+
+    def has_pdc_ssh_keys(self, nodes, pdc_ssh_keys):
+        """Return whether all nodes authorize exactly pdc_ssh_keys."""
+        for node in nodes:
+            ret = node.run_ssh('cat /etc/128technology/ssh/authorized_keys')
+            if (ret.returncode != 0 or
+                    ret.stdout.decode('ascii').strip() != pdc_ssh_keys.strip()):
+                return False
+        return True
+
+    def schedule_deploy(self, scheduler):
+        """Add the tasks deploying the nodes, return the last one.
+
+        Both nodes of a HA router are deployed at the same time, only the
+        secondary conductor node waits for its peer to be initialized.
+        """
+        initialized = {}
+        set_up = []
+        for node in self.nodes:
+            booted = scheduler.add(
+                '{}: deploy vm'.format(node.name), node.deploy_vm)
+            requires = [booted]
+            if node.role == 'conductor' and node.is_secondary:
+                # key exchange with the peer and learn-from-ha-peer
+                requires.append(initialized[node.peer_node])
+            initialized[node] = scheduler.add(
+                '{}: initialize'.format(node.name), node.initialize, requires)
+            set_up.append(scheduler.add(
+                '{}: set up'.format(node.name), node.set_up,
+                [initialized[node]]))
+        return scheduler.add('{}: sync pdc ssh keys'.format(self.name),
+                             self.sync_pdc_ssh_keys, set_up)
+
+    def schedule(self, scheduler, configure_requires=()):
+        """Add the tasks creating this router, return the last one."""
+        deployed = self.schedule_deploy(scheduler)
+        return scheduler.add('{}: configure'.format(self.name),
+                             self.configure,
+                             [deployed] + list(configure_requires))
 
     def deploy(self):
         """Deploy the nodes on hypervisors."""
-        success = False
-        for node in self.nodes:
-            success |= node.deploy()
-        if not success:
-            raise NoNodeDeployedException()
-
-        self.sync_pdc_ssh_keys()
+        scheduler = Scheduler()
+        self.schedule_deploy(scheduler)
+        scheduler.run()
 
+    @traced
     def configure(self):
         conductor_netconf_ip = self.deployment.conductor.ip_adresses[0]
         identity_file = self.deployment.conductor.netconf_key
@@ -100,38 +155,34 @@ class Router(object):
             with open('audit/{}.cfg'.format(self.name), 'w') as fd:
                 fd.write(text_config)
             xml_config = ct.get_xml_config(text_config, t128_model)
+            converter = ct.get_config_model(t128_model)
         except ConfigParseError as e:
             info("There was an error in the config: {}".format(e))
             return False
 
+        # pushed again whenever the template or the model produce other XML
+        config_hash = hashlib.sha256(etree.tostring(xml_config)).hexdigest()
+        if self.journal.completed(self.name, 'configured',
+                                  config_hash=config_hash):
+            return True
+
         try:
             with t128ConfigHelper(host=conductor_netconf_ip,
                                   key_filename=identity_file) as ch:
-                edit_status = ch.edit(xml_config, 'conductor timeout error')
-        except RPCError as e:
+                commit_status = ch.apply(xml_config, converter=converter)
+        except ConfigParseError as e:
             info("There was an error in the config: {}".format(e))
             return False
+        except t128ConfigError as e:
+            info("There was an error applying the config: {}".format(e))
+            return False
 
-        if isinstance(edit_status, str):
-            info(edit_status)
-
-        if edit_status.ok:
-            with t128ConfigHelper(host=conductor_netconf_ip,
-                                  key_filename=identity_file) as ch:
-                try:
-                    commit_status = ch.commit()
-                except RPCError as e:
-                    info("There was an error committing the configuration, please check the candidate config: {}".format(e))
-                    return False
-                if commit_status.ok:
-                    info("Configuration committed successfully")
-                    return True
-                else:
-                    info("There was an error committing the config")
-                    return False
+        if commit_status is None:
+            info("Configuration is already up to date")
         else:
-            info("There was an error adding the candidate config")
-            return False
+            info("Configuration committed successfully")
+        self.journal.record(self.name, 'configured', config_hash=config_hash)
+        return True
 
     def create(self):
         """Create a new router."""
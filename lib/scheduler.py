@@ -0,0 +1,83 @@
+"""Run deployment steps concurrently."""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextvars
+
+from lib.log import debug
+
+
+class Task(object):
+
+    def __init__(self, name, function, requires=()):
+        self.name = name
+        self.function = function
+        self.requires = list(requires)
+        self.exception = None
+        self.done = False
+
+
+class Scheduler(object):
+    """Run deployment steps concurrently as their dependencies allow.
+
+    A task is skipped if a task it requires has failed. After fatal() in a
+    task, running tasks are finished but no new ones started.
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.tasks = []
+
+    def add(self, name, function, requires=()):
+        """Add a task running function once all required tasks are done."""
+        task = Task(name, function, requires)
+        self.tasks.append(task)
+        return task
+
+    def run(self):
+        """Run all tasks, raise the first error after all have finished."""
+        for task in self.tasks:
+            for required in task.requires:
+                if required not in self.tasks:
+                    raise ValueError('Task {} requires {}, which is not'
+                                     ' scheduled'.format(task.name,
+                                                         required.name))
+        pending = list(self.tasks)
+        running = {}
+        aborted = False
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for task in list(pending):
+                    if aborted or any(t.exception for t in task.requires):
+                        debug('Skipping:', task.name)
+                        task.exception = task.exception or next(
+                            (t.exception for t in task.requires
+                             if t.exception), None)
+                        pending.remove(task)
+                    elif all(t.done for t in task.requires):
+                        debug('Starting:', task.name)
+                        # tasks see the context run() is called in, e.g.
+                        # the enclosing trace span
+                        running[executor.submit(
+                            contextvars.copy_context().run,
+                            task.function)] = task
+                        pending.remove(task)
+                if not running:
+                    if pending:
+                        # nothing left could complete what they require
+                        raise RuntimeError('Cannot start {}, {} never done'.format(
+                            ', '.join(task.name for task in pending),
+                            ', '.join(sorted(set(
+                                t.name for task in pending
+                                for t in task.requires if not t.done)))))
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    task.exception = future.exception()
+                    task.done = True
+                    if isinstance(task.exception, SystemExit):
+                        aborted = True
+                    elif task.exception is not None:
+                        debug('Failed:', task.name, repr(task.exception))
+        for task in self.tasks:
+            if task.exception is not None:
+                raise task.exception
@@ -0,0 +1,72 @@
+"""Jinja environments and template variables, kept once per process."""
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, meta
+from jinja2.exceptions import TemplateNotFound
+from jinja2.loaders import split_template_path
+import os
+import threading
+
+# number of template strings whose variables are remembered
+TEMPLATE_STRING_CACHE_SIZE = 128
+
+_environments = {}
+_template_variables = {}
+_template_string_variables = {}
+_lock = threading.Lock()
+
+
+def get_environment(template_dir):
+    """Return the jinja environment for template_dir.
+
+    Compiled templates are kept in the environment and reloaded when their
+    mtime changes, the bytecode cache spares recompiling them across runs.
+    """
+    template_dir = os.path.abspath(template_dir)
+    with _lock:
+        if template_dir not in _environments:
+            _environments[template_dir] = Environment(
+                loader=FileSystemLoader(template_dir),
+                auto_reload=True,
+                bytecode_cache=FileSystemBytecodeCache())
+        return _environments[template_dir]
+
+
+def _find_undeclared_variables(jinja, template_source):
+    parsed_content = jinja.parse(template_source)
+    return meta.find_undeclared_variables(parsed_content)
+
+
+def get_template_variables(template_dir, template_name):
+    """Return the undeclared variables of a template in template_dir.
+
+    Templates are only parsed again after they have been changed.
+    """
+    jinja = get_environment(template_dir)
+    template_file = os.path.join(os.path.abspath(template_dir),
+                                 *split_template_path(template_name))
+    try:
+        mtime = os.path.getmtime(template_file)
+    except OSError:
+        raise TemplateNotFound(template_name)
+    with _lock:
+        cached_mtime, variables = _template_variables.get(
+            template_file, (None, None))
+    if cached_mtime != mtime:
+        template_source = jinja.loader.get_source(jinja, template_name)[0]
+        variables = _find_undeclared_variables(jinja, template_source)
+        with _lock:
+            _template_variables[template_file] = (mtime, variables)
+    return set(variables)
+
+
+def get_template_string_variables(template_dir, template):
+    """Return the undeclared variables of the template source template."""
+    jinja = get_environment(template_dir)
+    with _lock:
+        variables = _template_string_variables.get(template)
+    if variables is None:
+        variables = _find_undeclared_variables(jinja, template)
+        with _lock:
+            if len(_template_string_variables) >= TEMPLATE_STRING_CACHE_SIZE:
+                _template_string_variables.clear()
+            _template_string_variables[template] = variables
+    return set(variables)
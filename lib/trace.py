@@ -0,0 +1,126 @@
+"""Timing of deployment steps."""
+from contextlib import contextmanager
+import contextvars
+import functools
+import json
+import threading
+import time
+
+# span the code running in this thread is part of
+_current_span = contextvars.ContextVar('span', default=None)
+
+
+class Span(object):
+
+    def __init__(self, name, track, parent, args):
+        self.name = name
+        self.track = track
+        self.parent = parent
+        self.args = args
+        self.start = time.time()
+        self.end = None
+
+    @property
+    def depth(self):
+        """Number of enclosing spans on the same track."""
+        depth = 0
+        parent = self.parent
+        while parent is not None and parent.track == self.track:
+            depth += 1
+            parent = parent.parent
+        return depth
+
+
+class Tracer(object):
+    """Collects spans, one track per deployment, router and node."""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, track=None, **args):
+        """Time the enclosed code, on the track of the enclosing span by
+        default."""
+        parent = _current_span.get()
+        if track is None:
+            track = parent.track if parent else 'main'
+        span = Span(name, track, parent, args)
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            span.end = time.time()
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(span)
+
+    def get_tracks(self):
+        """Return the track names in the order they started."""
+        tracks = []
+        for span in sorted(self.spans, key=lambda span: span.start):
+            if span.track not in tracks:
+                tracks.append(span.track)
+        return tracks
+
+    def write(self, filename):
+        """Write the spans as Chrome trace events (chrome://tracing)."""
+        with self._lock:
+            spans = list(self.spans)
+        if not spans:
+            return
+        origin = min(span.start for span in spans)
+        tracks = self.get_tracks()
+        events = []
+        for tid, track in enumerate(tracks):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1,
+                           'tid': tid, 'args': {'name': track}})
+        for span in spans:
+            events.append({
+                'name': span.name,
+                'cat': span.name.split('.')[0],
+                'ph': 'X',
+                'ts': int((span.start - origin) * 1e6),
+                'dur': int((span.end - span.start) * 1e6),
+                'pid': 1,
+                'tid': tracks.index(span.track),
+                'args': dict((k, str(v)) for k, v in span.args.items()),
+            })
+        with open(filename, 'w') as fd:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fd)
+
+    def waterfall(self, width=40):
+        """Return a text chart of when each span ran and how long."""
+        with self._lock:
+            spans = list(self.spans)
+        if not spans:
+            return 'No steps have been timed.'
+        origin = min(span.start for span in spans)
+        total = max(span.end for span in spans) - origin
+        scale = width / total if total else 0
+        label_width = max(2 * span.depth + len(span.name) for span in spans)
+        lines = ['Timing of {:.1f}s:'.format(total)]
+        for track in self.get_tracks():
+            lines.append(track)
+            for span in sorted((span for span in spans if span.track == track),
+                               key=lambda span: (span.start, -span.end)):
+                offset = span.start - origin
+                duration = span.end - span.start
+                bar = ' ' * int(offset * scale) + '#' * max(1, int(duration * scale))
+                lines.append('  {:<{}} {:7.1f}s {:7.1f}s |{:<{}}|'.format(
+                    '  ' * span.depth + span.name, label_width,
+                    offset, duration, bar, width))
+        return '\n'.join(lines)
+
+
+tracer = Tracer()
+
+
+def traced(method):
+    """Time a method, on the track of its object if it has a trace_track."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        name = '{}.{}'.format(self.__class__.__name__, method.__name__)
+        with tracer.span(name, getattr(self, 'trace_track', None)):
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from lib.journal import Journal
+
+
+def test_record_and_complete(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.json'))
+    assert journal.completed('node', 'booted') is None
+    journal.record('node', 'booted', vm_id=101)
+    data = journal.completed('node', 'booted')
+    assert data['vm_id'] == 101
+    assert 'time' in data
+    assert journal.completed('other', 'booted') is None
+
+
+def test_reload(tmp_path):
+    path = str(tmp_path / 'journal.json')
+    Journal(path).record('node', 'set up', pci_addresses={'lan': '0:1'})
+    assert Journal(path).completed('node', 'set up')['pci_addresses'] == {
+        'lan': '0:1'}
+    with open(path) as fd:
+        assert 'set up' in json.load(fd)['node']
+    assert not (tmp_path / 'journal.json.tmp').exists()
+
+
+def test_verify(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.json'))
+    journal.record('node', 'licensed')
+    checked = []
+
+    def verify(data):
+        checked.append(data)
+        return True
+
+    assert journal.completed('node', 'licensed', verify) is not None
+    assert len(checked) == 1
+
+
+def test_verify_fails(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.json'))
+    journal.record('node', 'initialized')
+    with pytest.raises(SystemExit):
+        journal.completed('node', 'initialized', lambda data: False)
+
+
+def test_not_verified_when_not_recorded(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.json'))
+    assert journal.completed('node', 'licensed', lambda data: False) is None
+
+
+def test_expected_values(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.json'))
+    journal.record('router', 'configured', config_hash='a')
+    assert journal.completed('router', 'configured', config_hash='a')
+    assert journal.completed('router', 'configured', config_hash='b') is None
+    # not verified either, the step is done again anyway
+    assert journal.completed('router', 'configured', lambda data: False,
+                             config_hash='b') is None
+    journal.record('router', 'configured', config_hash='b')
+    assert journal.completed('router', 'configured', config_hash='b')
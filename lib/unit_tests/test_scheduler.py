@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+from lib.scheduler import Scheduler
+from lib.trace import Tracer
+
+
+def test_requirements_run_first():
+    done = []
+    scheduler = Scheduler()
+    first = scheduler.add('first', lambda: done.append('first'))
+    second = scheduler.add('second', lambda: done.append('second'), [first])
+    scheduler.add('third', lambda: done.append('third'), [first, second])
+    scheduler.run()
+    assert done == ['first', 'second', 'third']
+
+
+def test_independent_tasks_run_concurrently():
+    # both tasks have to be running at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    scheduler = Scheduler(max_workers=2)
+    scheduler.add('a', barrier.wait)
+    scheduler.add('b', barrier.wait)
+    scheduler.run()
+
+
+def test_failure_skips_dependent_tasks():
+    done = []
+
+    def fail():
+        raise ValueError('broken')
+
+    scheduler = Scheduler()
+    failed = scheduler.add('failed', fail)
+    skipped = scheduler.add('skipped', lambda: done.append('skipped'),
+                            [failed])
+    also_skipped = scheduler.add('also skipped',
+                                 lambda: done.append('also skipped'),
+                                 [skipped])
+    scheduler.add('other', lambda: done.append('other'))
+    with pytest.raises(ValueError, match='broken'):
+        scheduler.run()
+    assert done == ['other']
+    assert isinstance(skipped.exception, ValueError)
+    assert also_skipped.exception is failed.exception
+
+
+def test_exit_starts_no_new_tasks():
+    done = []
+    release = threading.Event()
+
+    def abort():
+        release.set()
+        raise SystemExit(1)
+
+    scheduler = Scheduler(max_workers=2)
+    scheduler.add('abort', abort)
+    slow = scheduler.add('slow', lambda: release.wait(5))
+    scheduler.add('after slow', lambda: done.append('after slow'), [slow])
+    with pytest.raises(SystemExit):
+        scheduler.run()
+    assert slow.done
+    assert done == []
+
+
+def test_requirement_not_scheduled():
+    other = Scheduler().add('elsewhere', lambda: None)
+    scheduler = Scheduler()
+    scheduler.add('task', lambda: None, [other])
+    with pytest.raises(ValueError, match='task requires elsewhere'):
+        scheduler.run()
+
+
+def test_requirements_never_done():
+    scheduler = Scheduler()
+    first = scheduler.add('first', lambda: None)
+    second = scheduler.add('second', lambda: None, [first])
+    first.requires.append(second)
+    with pytest.raises(RuntimeError, match='Cannot start first, second'):
+        scheduler.run()
+
+
+def test_spans_of_tasks_nest_in_the_enclosing_span():
+    tracer = Tracer()
+
+    def step(name):
+        with tracer.span(name, track=name):
+            with tracer.span(name + ' part'):
+                pass
+
+    scheduler = Scheduler(max_workers=2)
+    first = scheduler.add('first', lambda: step('first'))
+    scheduler.add('second', lambda: step('second'), [first])
+    with tracer.span('deployment') as deployment:
+        scheduler.run()
+    spans = dict((span.name, span) for span in tracer.spans)
+    assert spans['first'].parent is deployment
+    assert spans['second'].parent is deployment
+    assert spans['first part'].parent is spans['first']
+    assert spans['first part'].track == 'first'
@@ -1,12 +1,184 @@
 """Base class for 128T virtual machines."""
+import base64
 from collections import OrderedDict
 import json
-from openssh_wrapper import SSHConnection, SSHError
+from openssh_wrapper import SSHConnection, SSHError, SSHResult, b, b_list, b_quote, u, u_list
 import os
 from passlib.hash import sha512_crypt
+import shutil
+import subprocess
 from subprocess import check_call, check_output, CalledProcessError
+import tempfile
+import threading
 
-from lib.log import debug, fatal
+from lib.log import debug, fatal, info
+from lib.trace import traced
+
+# idle seconds after which a master connection exits by itself
+CONTROL_PERSIST = 600
+
+_control_dir = None
+_control_lock = threading.Lock()
+
+
+def get_control_dir():
+    """Return the directory holding the master connection sockets."""
+    global _control_dir
+    with _control_lock:
+        if _control_dir is None:
+            _control_dir = tempfile.mkdtemp(prefix='hyper-128t-ssh-')
+        return _control_dir
+
+
+def close_ssh_masters():
+    """Close all master connections opened by get_ssh_conn."""
+    global _control_dir
+    with _control_lock:
+        control_dir, _control_dir = _control_dir, None
+    if control_dir is None:
+        return
+    for name in os.listdir(control_dir):
+        debug('Closing ssh master connection:', name)
+        subprocess.call(
+            ['/usr/bin/ssh', '-o', 'ControlPath={}'.format(
+                os.path.join(control_dir, name)), '-O', 'exit', 'master'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    shutil.rmtree(control_dir, ignore_errors=True)
+
+
+class ThreadSafeSSHConnection(SSHConnection):
+    """SSH connection which can run commands from any thread.
+
+    SSHConnection times out with SIGALRM, which only works in the main
+    thread, while deployment steps run in a thread pool.
+    """
+
+    def communicate(self, command, input=None, description=None):
+        """Run command locally, description names it in a timeout error."""
+        pipe = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, env=self.get_env())
+        try:
+            out, err = pipe.communicate(input, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            pipe.kill()
+            pipe.communicate()
+            raise SSHError('{} on {} timed out after {} seconds'.format(
+                description or ' '.join(u_list(command)), u(self.server),
+                self.timeout))
+        return pipe.returncode, out, err
+
+    def run(self, command, interpreter='/bin/bash', forward_ssh_agent=False,
+            description=None):
+        if description is None:
+            description = 'Command "{}"'.format(u(command))
+        returncode, out, err = self.communicate(
+            self.ssh_command(interpreter, forward_ssh_agent), b(command),
+            description)
+        if returncode == 255:  # ssh client error
+            raise SSHError(err.strip())
+        return SSHResult(command, out.strip(), err.strip(), returncode)
+
+    def scp(self, files, target, mode=None, owner=None):
+        filenames, tmpdir = self.convert_files_to_filenames(files)
+        try:
+            returncode, _, err = self.communicate(
+                self.scp_command(filenames, target), description=(
+                    'Copying {} to {}'.format(', '.join(u_list(filenames)),
+                                              u(target))))
+            if returncode != 0:
+                raise SSHError(err.strip())
+            if mode or owner:
+                targets = self.get_scp_targets(filenames, target)
+                for cmd_chunks in (['chmod', mode], ['chown', owner]):
+                    if cmd_chunks[1]:
+                        result = self.run(b_quote(cmd_chunks + targets))
+                        if result.returncode:
+                            raise SSHError(result.stderr.strip())
+        finally:
+            if tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+class MultiplexedSSHConnection(ThreadSafeSSHConnection):
+    """SSH connection sharing one master connection per host and login.
+
+    Only the first command to a host does the ssh handshake, later commands
+    and file copies open a new session on the master connection.
+    """
+
+    def control_options(self):
+        return b_list([
+            '-o', 'ControlMaster=auto',
+            '-o', 'ControlPath={}'.format(
+                os.path.join(get_control_dir(), '%C')),
+            '-o', 'ControlPersist={}'.format(CONTROL_PERSIST),
+        ])
+
+    def ssh_command(self, interpreter, forward_ssh_agent):
+        cmd = super().ssh_command(interpreter, forward_ssh_agent)
+        return cmd[:1] + self.control_options() + cmd[1:]
+
+    def scp_command(self, files, target):
+        cmd = super().scp_command(files, target)
+        return cmd[:1] + self.control_options() + cmd[1:]
+
+
+class CommandResult(object):
+    """Outcome of one command run by VM.run_batch."""
+
+    def __init__(self, command, returncode, stdout, stderr, duration):
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+
+    def __repr__(self):
+        return '<CommandResult {!r} returncode={} duration={:.3f}s>'.format(
+            self.command, self.returncode, self.duration)
+
+
+# prefix of the lines carrying the results of a batch
+BATCH_MARKER = 'hyper-128t-result'
+
+
+def build_batch_script(commands):
+    """Return a bash script running commands one after the other.
+
+    Every command runs in its own subshell, as it would in its own ssh
+    session, and the script reports one line per command.
+    """
+    lines = ['_d=$(mktemp -d)']
+    for index, command in enumerate(commands):
+        lines += [
+            '_s=$(date +%s%N)',
+            '(',
+            command,
+            ') </dev/null >$_d/out 2>$_d/err',
+            '_r=$?',
+            # the trailing dot keeps an empty stderr from being stripped
+            'echo {} {} $_r $_s $(date +%s%N) "$(base64 -w0 $_d/out)" '
+            '"$(base64 -w0 $_d/err)" .'.format(BATCH_MARKER, index),
+        ]
+    lines.append('rm -rf $_d')
+    return '\n'.join(lines) + '\n'
+
+
+def parse_batch_output(commands, output):
+    """Return the CommandResult of each command reported in output."""
+    results = []
+    for line in output.splitlines():
+        fields = line.decode('ascii', 'replace').split(' ')
+        if fields[0] != BATCH_MARKER or len(fields) != 8:
+            continue
+        index, returncode, start, end = map(int, fields[1:5])
+        results.append(CommandResult(
+            commands[index], returncode,
+            base64.b64decode(fields[5]).strip(),
+            base64.b64decode(fields[6]).strip(),
+            (end - start) / 1e9))
+    return results
 
 
 def get_ssh_conn(ip_address, login='root', identity_file=None):
@@ -14,8 +186,9 @@ def get_ssh_conn(ip_address, login='root', identity_file=None):
     configfile = 'ssh_config'
     if not os.path.isfile(configfile):
         configfile = None
-    return SSHConnection(ip_address, login=login, configfile=configfile,
-                         identity_file=identity_file)
+    return MultiplexedSSHConnection(ip_address, login=login,
+                                    configfile=configfile,
+                                    identity_file=identity_file)
 
 
 def scp_down(ip_address, source_file, destination_file, login='root', identity_file=None):
@@ -96,25 +269,59 @@ class VM(object):
                               'neither in ssh-agent nor on disk.')
 
     def run_ssh(self, commands):
-        """Run ssh commands on virtual machine."""
+        """Run ssh commands on virtual machine.
+
+        Several commands are run in a single batch, the result of the last
+        one is returned.
+        """
+        if type(commands) in (tuple, list):
+            results = self.run_batch(commands)
+            return results[-1] if results else None
         identity_file = self.ssh_keys_private.get('root')
         conn = get_ssh_conn(self.ip_address, identity_file=identity_file)
-        if type(commands) not in (tuple, list):
-            commands = [commands]
-        for command in commands:
-            ret = conn.run(command)
-            if ret.returncode != 0:
-                debug('Running command has failed:', command)
-                debug('stdout:', ret.stdout)
-                debug('stderr:', ret.stderr)
+        ret = conn.run(commands)
+        if ret.returncode != 0:
+            info('Running command has failed on {}:'.format(self.name),
+                 commands)
+            debug('stdout:', ret.stdout)
+            debug('stderr:', ret.stderr)
         return ret
 
+    def run_batch(self, commands):
+        """Run ssh commands on virtual machine in a single round trip.
+
+        Returns a CommandResult for each command. Each command runs even
+        if an earlier one has failed, like separate run_ssh calls would.
+        """
+        if not commands:
+            return []
+        identity_file = self.ssh_keys_private.get('root')
+        conn = get_ssh_conn(self.ip_address, identity_file=identity_file)
+        # keep the time allowed per command
+        conn.timeout *= max(len(commands), 1)
+        ret = conn.run(build_batch_script(commands),
+                       description='Batch of {} commands'.format(
+                           len(commands)))
+        results = parse_batch_output(commands, ret.stdout)
+        if len(results) != len(commands):
+            raise SSHError('Batch stopped after {} of {} commands: {}'.format(
+                len(results), len(commands), ret.stderr))
+        for result in results:
+            debug('Ran in {:.3f}s:'.format(result.duration), result.command)
+            if result.returncode != 0:
+                info('Running command has failed on {}:'.format(self.name),
+                     result.command)
+                debug('stdout:', result.stdout)
+                debug('stderr:', result.stderr)
+        return results
+
     def run_scp(self, source, target, mode='0644', owner='root:'):
         """Run scp commands to virtual machine."""
         identity_file = self.ssh_keys_private.get('root')
         conn = get_ssh_conn(self.ip_address, identity_file=identity_file)
         conn.scp((source, ), target=target, mode=mode, owner=owner)
 
+    @traced
     def retrieve_pci_addresses(self):
         """Retrieve pci addresses for network interfaces."""
         debug('Retrieve PCI addresses...')
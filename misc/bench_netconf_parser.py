@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Measure the throughput of the NETCONF framing parser on one large reply.
+
+The framed reply is fed to ncclient's DefaultXMLParser from memory in reads
+of a fixed size, so neither ssh nor XML parsing are part of the timing.
+"""
+
+# allow to run the script from 'misc' directory
+import sys
+sys.path.append('.')
+
+import argparse
+from io import BytesIO
+import time
+
+from ncclient.transport.parser import DefaultXMLParser
+from ncclient.transport.session import NetconfBase
+
+# (chunk size or None for NETCONF 1.0, read size) of each run
+RUNS = (
+    (None, 32768),
+    ('whole', 32768),
+    (1024, 262144),
+)
+
+
+class FakeSession(object):
+    """The parts of a session the parser uses, keeping the messages."""
+
+    def __init__(self, base):
+        self._base = base
+        self._buffer = BytesIO()
+        self._message_list = []
+        self._streams = {}
+        self.messages = []
+        self.parser = DefaultXMLParser(self)
+
+    def _dispatch_message(self, raw, size=None):
+        self.messages.append(raw)
+
+
+def frame(message, chunk_size):
+    """Return message framed for NETCONF 1.0 if chunk_size is None, else
+    in chunks of chunk_size bytes for NETCONF 1.1."""
+    if chunk_size is None:
+        return message + b']]>]]>'
+    chunks = []
+    for start in range(0, len(message), chunk_size):
+        chunk = message[start:start + chunk_size]
+        chunks.append(b'\n#%d\n' % len(chunk) + chunk)
+    return b''.join(chunks) + b'\n##\n'
+
+
+def run(message, chunk_size, read_size):
+    base = NetconfBase.BASE_10 if chunk_size is None else NetconfBase.BASE_11
+    data = frame(message, chunk_size)
+    session = FakeSession(base)
+    started = time.time()
+    for start in range(0, len(data), read_size):
+        session.parser.parse(data[start:start + read_size])
+    elapsed = time.time() - started
+    if len(session.messages) != 1:
+        sys.exit('The reply has not been parsed.')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('size', type=int, nargs='?', default=50,
+                        help='size of the reply in MB (default: 50)')
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    message = b''.join((
+        b'<rpc-reply xmlns="urn:ietf:params:xml:ns:netconf:base:1.0"'
+        b' message-id="1"><data>', b'x' * size, b'</data></rpc-reply>'))
+    for chunk_size, read_size in RUNS:
+        if chunk_size == 'whole':
+            chunk_size = len(message)
+        elapsed = run(message, chunk_size, read_size)
+        framing = ('1.0' if chunk_size is None else
+                   '1.1, {} byte chunks'.format(chunk_size))
+        print('{} MB, {}, {} byte reads: {:.2f}s, {:.0f} MB/s'.format(
+            args.size, framing, read_size, elapsed, args.size / elapsed))
+
+
+if __name__ == '__main__':
+    main()
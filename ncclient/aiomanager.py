@@ -0,0 +1,179 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+asyncio counterpart of :mod:`ncclient.manager`, the operations are coroutines::
+
+    m = await aiomanager.connect(host="router", username="admin")
+    async with m:
+        await m.edit_config(target="candidate", config=config)
+        await m.commit()
+
+Requires the asyncssh package.
+"""
+
+import asyncio
+import functools
+import logging
+
+from ncclient import operations
+from ncclient.manager import OPERATIONS, VENDOR_OPERATIONS, make_device_handler, _extract_device_params, _extract_manager_params
+from ncclient.transport.aiossh import AsyncSSHSession
+from ncclient.xml_ import new_ele
+
+logger = logging.getLogger('ncclient.aiomanager')
+
+
+async def connect(*args, **kwds):
+    """
+    Initialize an :class:`AsyncManager` over the asyncio SSH transport. Takes the same
+    arguments as :func:`ncclient.manager.connect_ssh`, see
+    :meth:`ncclient.transport.aiossh.AsyncSSHSession.connect`.
+    """
+    device_params = _extract_device_params(kwds)
+    manager_params = _extract_manager_params(kwds)
+
+    device_handler = make_device_handler(device_params)
+    device_handler.add_additional_ssh_connect_params(kwds)
+    VENDOR_OPERATIONS.update(device_handler.add_additional_operations())
+    session = AsyncSSHSession(device_handler)
+
+    try:
+        await session.connect(*args, **kwds)
+    except Exception:
+        session.close()
+        await session.wait_closed()
+        raise
+    return AsyncManager(session, device_handler, **manager_params)
+
+
+def _resolve(future, rpc):
+    if future.done():
+        # the caller gave up waiting
+        return
+    try:
+        future.set_result(rpc._process_reply())
+    except Exception as e:
+        future.set_exception(e)
+
+
+class AsyncManager(object):
+
+    """
+    For details on the expected behavior of the operations and their
+    parameters refer to :rfc:`4741`. Every operation of :class:`~ncclient.manager.Manager` is
+    available as a coroutine returning the same reply, so many RPCs on many sessions can be in
+    flight at once from a single event loop.
+    """
+
+    HUGE_TREE_DEFAULT = False
+    """Default for `huge_tree` support for XML parsing of RPC replies (defaults to False)"""
+
+    def __init__(self, session, device_handler, timeout=30):
+        self._session = session
+        self._timeout = timeout
+        self._raise_mode = operations.RaiseMode.ALL
+        self._huge_tree = self.HUGE_TREE_DEFAULT
+        self._device_handler = device_handler
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close_session()
+        return False
+
+    async def execute(self, cls, *args, **kwds):
+        future = asyncio.get_running_loop().create_future()
+        rpc = cls(self._session,
+                  device_handler=self._device_handler,
+                  async_mode=True,
+                  timeout=self._timeout,
+                  raise_mode=self._raise_mode,
+                  huge_tree=self._huge_tree)
+        rpc.request(*args, **kwds)
+        rpc.add_done_callback(functools.partial(_resolve, future))
+        try:
+            return await asyncio.wait_for(future, self._timeout)
+        except asyncio.TimeoutError:
+            # a late reply is dropped instead of resolving a future nobody awaits
+            rpc._listener.unregister(rpc.id, drop_reply=True)
+            raise operations.TimeoutExpiredError('ncclient timed out while waiting for an rpc reply.')
+
+    async def close_session(self):
+        """Requests termination of the NETCONF session and waits for the SSH connection underneath
+        it to be closed."""
+        try:
+            if self._session.connected:
+                # operations.CloseSession closes the transport without waiting for the reply
+                await self.execute(operations.Dispatch, new_ele("close-session"))
+        finally:
+            self._session.close()
+            await self._session.wait_closed()
+
+    def __getattr__(self, method):
+        if method in VENDOR_OPERATIONS:
+            return functools.partial(self.execute, VENDOR_OPERATIONS[method])
+        elif method in OPERATIONS:
+            return functools.partial(self.execute, OPERATIONS[method])
+        raise AttributeError(method)
+
+    @property
+    def client_capabilities(self):
+        """:class:`~ncclient.capabilities.Capabilities` object representing
+        the client's capabilities."""
+        return self._session._client_capabilities
+
+    @property
+    def server_capabilities(self):
+        """:class:`~ncclient.capabilities.Capabilities` object representing
+        the server's capabilities."""
+        return self._session._server_capabilities
+
+    @property
+    def session_id(self):
+        """`session-id` assigned by the NETCONF server."""
+        return self._session.id
+
+    @property
+    def connected(self):
+        """Whether currently connected to the NETCONF server."""
+        return self._session.connected
+
+    @property
+    def timeout(self):
+        """Specify the timeout in seconds for RPC requests."""
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        self._timeout = timeout
+
+    @property
+    def raise_mode(self):
+        """Specify which errors are raised as :exc:`~ncclient.operations.RPCError`
+        exceptions, see :attr:`ncclient.manager.Manager.raise_mode`."""
+        return self._raise_mode
+
+    @raise_mode.setter
+    def raise_mode(self, mode):
+        assert(mode in (operations.RaiseMode.NONE, operations.RaiseMode.ERRORS, operations.RaiseMode.ALL))
+        self._raise_mode = mode
+
+    @property
+    def huge_tree(self):
+        """Whether `huge_tree` support for XML parsing of RPC replies is enabled (default=False)"""
+        return self._huge_tree
+
+    @huge_tree.setter
+    def huge_tree(self, x):
+        self._huge_tree = x
@@ -24,6 +24,8 @@ from ncclient import transport
 import six
 import logging
 import functools
+import threading
+from concurrent.futures import Future, wait
 
 from ncclient.xml_ import *
 
@@ -227,13 +229,16 @@ class Manager(object):
         assert(mode in (operations.RaiseMode.NONE, operations.RaiseMode.ERRORS, operations.RaiseMode.ALL))
         self._raise_mode = mode
 
-    def execute(self, cls, *args, **kwds):
+    def _rpc(self, cls, async_mode=None):
         return cls(self._session,
                    device_handler=self._device_handler,
-                   async_mode=self._async_mode,
+                   async_mode=self._async_mode if async_mode is None else async_mode,
                    timeout=self._timeout,
                    raise_mode=self._raise_mode,
-                   huge_tree=self._huge_tree).request(*args, **kwds)
+                   huge_tree=self._huge_tree)
+
+    def execute(self, cls, *args, **kwds):
+        return self._rpc(cls).request(*args, **kwds)
 
     def locked(self, target):
         """Returns a context manager for a lock on a datastore, where
@@ -252,6 +257,28 @@ class Manager(object):
         """
         return operations.LockContext(self._session, self._device_handler, target)
 
+    def streaming(self, callbacks):
+        """Returns a :class:`Streaming` proxy whose operations parse the reply incrementally while
+        it arrives, handing the elements matching the paths in *callbacks* to the corresponding
+        function (see :class:`~ncclient.operations.rpc.RPCReplyStream`)::
+
+            def add_router(router):
+                names.append(router.findtext('{*}name'))
+
+            m.streaming({'data/config/authority/router': add_router}).get_config(source='running')
+        """
+        return Streaming(self, callbacks)
+
+    def pipeline(self, max_in_flight=None):
+        """Returns a :class:`Pipeline` that sends RPCs over this session without waiting for each
+        reply, with at most *max_in_flight* of them outstanding (see :data:`Pipeline.MAX_IN_FLIGHT`)::
+
+            with m.pipeline() as p:
+                futures = [p.get(filter=f) for f in filters]
+            replies = [f.result() for f in futures]
+        """
+        return Pipeline(self, max_in_flight or Pipeline.MAX_IN_FLIGHT)
+
     def scp(self):
         return self._session.scp()
 
@@ -347,3 +374,130 @@ class Manager(object):
     @huge_tree.setter
     def huge_tree(self, x):
         self._huge_tree = x
+
+
+class PipelinedFuture(Future):
+
+    """:class:`~concurrent.futures.Future` of a pipelined RPC. It is done once the reply has been
+    received, the reply is parsed by the first call of :meth:`result` or :meth:`exception`, so the
+    session keeps reading further replies meanwhile."""
+
+    def __init__(self):
+        Future.__init__(self)
+        self._process_lock = threading.Lock()
+        self._processed = False
+        self._value = None
+        self._error = None
+
+    def _process(self, timeout):
+        rpc = Future.result(self, timeout)
+        with self._process_lock:
+            if not self._processed:
+                try:
+                    self._value = rpc._process_reply()
+                except Exception as e:
+                    self._error = e
+                self._processed = True
+
+    def result(self, timeout=None):
+        self._process(timeout)
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def exception(self, timeout=None):
+        self._process(timeout)
+        return self._error
+
+
+class Pipeline(object):
+
+    """Sends RPCs back to back over the session of a :class:`Manager`, replies are matched to
+    their requests by message-id as they come in. Every operation of the manager is available and
+    returns a :class:`PipelinedFuture` resolving to what the synchronous call returns,
+    or raising what it raises. Once *max_in_flight* RPCs are outstanding, further requests block
+    until a reply is received.
+
+    Pipelines are context managers that wait for all outstanding replies on exit.
+    """
+
+    MAX_IN_FLIGHT = 16
+    """Default maximum number of RPCs waiting for a reply."""
+
+    def __init__(self, manager, max_in_flight=MAX_IN_FLIGHT):
+        self._manager = manager
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.wait()
+        return False
+
+    def execute(self, cls, *args, **kwds):
+        manager = self._manager
+        if not self._slots.acquire(timeout=manager.timeout):
+            raise operations.TimeoutExpiredError('ncclient timed out waiting for a pipelined rpc reply.')
+        future = PipelinedFuture()
+        try:
+            rpc = manager._rpc(cls, async_mode=True)
+            rpc.request(*args, **kwds)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending.add(future)
+        rpc.add_done_callback(functools.partial(self._resolve, future))
+        return future
+
+    def _resolve(self, future, rpc):
+        # runs on the session thread, the reply is parsed by whoever asks for the result
+        self._slots.release()
+        with self._lock:
+            self._pending.discard(future)
+        future.set_result(rpc)
+
+    def wait(self, timeout=None):
+        """Blocks until all outstanding RPCs have been answered, or raises
+        :exc:`~ncclient.operations.TimeoutExpiredError` after *timeout* seconds (the manager's
+        timeout by default)."""
+        with self._lock:
+            pending = list(self._pending)
+        if pending:
+            _, not_done = wait(pending, self._manager.timeout if timeout is None else timeout)
+            if not_done:
+                raise operations.TimeoutExpiredError('ncclient timed out while waiting for %d pipelined rpc replies.' % len(not_done))
+
+    def __getattr__(self, method):
+        if method in VENDOR_OPERATIONS:
+            return functools.partial(self.execute, VENDOR_OPERATIONS[method])
+        elif method in OPERATIONS:
+            return functools.partial(self.execute, OPERATIONS[method])
+        raise AttributeError(method)
+
+
+class Streaming(object):
+
+    """Proxy of a :class:`Manager` whose operations hand the elements of the reply matching the
+    paths in *callbacks* to the corresponding function as the reply arrives, see
+    :meth:`Manager.streaming`. The operations return a
+    :class:`~ncclient.operations.rpc.StreamedRPCReply`."""
+
+    def __init__(self, manager, callbacks):
+        self._manager = manager
+        self._callbacks = callbacks
+
+    def execute(self, cls, *args, **kwds):
+        rpc = self._manager._rpc(cls)
+        rpc.stream(self._callbacks)
+        return rpc.request(*args, **kwds)
+
+    def __getattr__(self, method):
+        if method in VENDOR_OPERATIONS:
+            return functools.partial(self.execute, VENDOR_OPERATIONS[method])
+        elif method in OPERATIONS:
+            return functools.partial(self.execute, OPERATIONS[method])
+        raise AttributeError(method)
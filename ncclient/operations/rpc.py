@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 from threading import Event, Lock
 from uuid import uuid4
 import six
@@ -189,6 +190,92 @@ class RPCReply(object):
         return self._errors
 
 
+class RPCReplyStream(object):
+
+    """Parses an *rpc-reply* incrementally as it arrives, see :meth:`RPC.stream`.
+
+    *callbacks* maps element paths to functions that are called with each matching element once it
+    has been parsed completely. Paths are relative to the *rpc-reply* element and consist of local
+    names separated by `/`, e.g. `data/authority/router`. After the callback returns, the element
+    and its preceding siblings are dropped from the tree, so callbacks must copy whatever they want
+    to keep.
+    """
+
+    def __init__(self, rpc, callbacks, huge_tree=False):
+        self._rpc = rpc
+        self._callbacks = dict((tuple(path.strip('/').split('/')), fn) for path, fn in six.iteritems(callbacks))
+        # only the end of elements that may match a path is reported by the parser
+        tags = set('{*}' + path[-1] for path in self._callbacks)
+        tags.add('{*}rpc-error')
+        self._parser = etree.XMLPullParser(events=('end',), tag=sorted(tags), huge_tree=huge_tree)
+        self._parent = None
+        self._parent_path = None
+        self._errors = []
+        self._error = None
+        self._size = 0
+
+    def feed(self, data):
+        self._size += len(data)
+        if self._error is not None:
+            return
+        try:
+            self._parser.feed(data)
+            self._process_events()
+        except Exception as e:
+            # no use in parsing the rest of the reply
+            self._error = e
+
+    def close(self):
+        if self._error is None:
+            try:
+                self._parser.close()
+                self._process_events()
+            except Exception as e:
+                self._error = e
+        metrics = self._rpc._session._metrics
+        if metrics is not None:
+            metrics.replied(self._rpc.id, self._size)
+        self._rpc._deliver_stream(self._error, self._errors)
+
+    def _process_events(self):
+        for _, ele in self._parser.read_events():
+            parent = ele.getparent()
+            if parent is None:
+                continue
+            if parent is not self._parent:
+                # siblings usually come in a row, only look up the ancestors once
+                path = [ancestor.tag.rpartition('}')[2] for ancestor in parent.iterancestors()]
+                path.reverse()
+                # drop the <rpc-reply> itself
+                path.append(parent.tag.rpartition('}')[2])
+                self._parent = parent
+                self._parent_path = tuple(path[1:])
+            path = self._parent_path + (ele.tag.rpartition('}')[2],)
+            fn = self._callbacks.get(path)
+            if fn is not None:
+                fn(ele)
+            elif path == ('rpc-error',):
+                self._errors.append(self._rpc.REPLY_CLS.ERROR_CLS(ele))
+                continue
+            else:
+                # same name at another level
+                continue
+            ele.clear()
+            while ele.getprevious() is not None:
+                del ele.getparent()[0]
+
+
+class StreamedRPCReply(RPCReply):
+
+    """*rpc-reply* that has been handed to the callbacks of an :class:`RPCReplyStream` while it
+    arrived. Only knows whether the operation was successful."""
+
+    def __init__(self, errors, huge_tree=False):
+        RPCReply.__init__(self, '', huge_tree)
+        self._errors = errors
+        self._parsed = True
+
+
 class RPCReplyListener(SessionListener): # internal use
 
     creation_lock = Lock()
@@ -201,6 +288,7 @@ class RPCReplyListener(SessionListener): # internal use
                 instance = object.__new__(cls)
                 instance._lock = Lock()
                 instance._id2rpc = {}
+                instance._dropped = set()
                 instance._device_handler = device_handler
                 #instance._pipelined = session.can_pipeline
                 session.add_listener(instance)
@@ -212,6 +300,13 @@ class RPCReplyListener(SessionListener): # internal use
         with self._lock:
             self._id2rpc[id] = rpc
 
+    def unregister(self, id, drop_reply=False):
+        """Stop delivering the reply to *id*. With *drop_reply* set, the reply is expected to
+        arrive still and is dropped then, instead of failing as an unknown message-id."""
+        with self._lock:
+            if self._id2rpc.pop(id, None) is not None and drop_reply:
+                self._dropped.add(id)
+
     def callback(self, root, raw):
         tag, attrs = root
         if self._device_handler.perform_qualify_check():
@@ -228,6 +323,10 @@ class RPCReplyListener(SessionListener): # internal use
                     self.logger.debug("Delivering to %r", rpc)
                     rpc.deliver_reply(raw)
                 except KeyError:
+                    if id in self._dropped:
+                        self._dropped.discard(id)
+                        self.logger.debug("Dropping late reply to %s", id)
+                        return
                     raise OperationError("Unknown 'message-id': %s" % id)
                 # no catching other exceptions, fail loudly if must
                 else:
@@ -302,6 +401,8 @@ class RPC(object):
         self._reply = None
         self._error = None
         self._event = Event()
+        self._done_lock = Lock()
+        self._done_callbacks = []
         self._device_handler = device_handler
         self.logger = SessionLoggerAdapter(logger, {'session': session})
 
@@ -332,27 +433,41 @@ class RPC(object):
             self.logger.debug('Sync request, will wait for timeout=%r', self._timeout)
             self._event.wait(self._timeout)
             if self._event.isSet():
-                if self._error:
-                    # Error that prevented reply delivery
-                    raise self._error
-                self._reply.parse()
-                if self._reply.error is not None and not self._device_handler.is_rpc_error_exempt(self._reply.error.message):
-                    # <rpc-error>'s [ RPCError ]
-
-                    if self._raise_mode == RaiseMode.ALL or (self._raise_mode == RaiseMode.ERRORS and self._reply.error.severity == "error"):
-                        errlist = []
-                        errors = self._reply.errors
-                        if len(errors) > 1:
-                            raise RPCError(to_ele(self._reply._raw), errs=errors)
-                        else:
-                            raise self._reply.error
-                if self._device_handler.transform_reply():
-                    return NCElement(self._reply, self._device_handler.transform_reply(), huge_tree=self._huge_tree)
-                else:
-                    return self._reply
+                return self._process_reply()
             else:
                 raise TimeoutExpiredError('ncclient timed out while waiting for an rpc reply.')
 
+    def _process_reply(self):
+        """Called once the :attr:`event` is set. Raises the error that prevented reply delivery or,
+        depending on the :attr:`raise_mode`, the `rpc-error` in the reply. Otherwise returns the reply
+        the same way a synchronous request does."""
+        if self._error:
+            # Error that prevented reply delivery
+            raise self._error
+        metrics = self._session._metrics
+        if metrics is not None and not self._reply._parsed:
+            started = time.time()
+            self._reply.parse()
+            metrics.parsed(time.time() - started)
+        else:
+            self._reply.parse()
+        if self._reply.error is not None and not self._device_handler.is_rpc_error_exempt(self._reply.error.message):
+            # <rpc-error>'s [ RPCError ]
+
+            if self._raise_mode == RaiseMode.ALL or (self._raise_mode == RaiseMode.ERRORS and self._reply.error.severity == "error"):
+                errors = self._reply.errors
+                if len(errors) > 1:
+                    if isinstance(self._reply, StreamedRPCReply):
+                        # the reply is not kept, only its <rpc-error> elements
+                        raise RPCError(errors[0]._raw, errs=errors)
+                    raise RPCError(to_ele(self._reply._raw), errs=errors)
+                else:
+                    raise self._reply.error
+        if self._device_handler.transform_reply() and not isinstance(self._reply, StreamedRPCReply):
+            return NCElement(self._reply, self._device_handler.transform_reply(), huge_tree=self._huge_tree)
+        else:
+            return self._reply
+
     def request(self):
         """Subclasses must implement this method. Typically only the request needs to be built as an
         :class:`~xml.etree.ElementTree.Element` and everything else can be handed off to
@@ -366,15 +481,48 @@ class RPC(object):
         if capability not in self._session.server_capabilities:
             raise MissingCapabilityError('Server does not support [%s]' % capability)
 
+    def add_done_callback(self, fn):
+        """Call *fn* with this RPC as its only argument once the :attr:`event` is set. If it is
+        already set *fn* is called right away, otherwise it is called from the session thread."""
+        with self._done_lock:
+            if not self._event.isSet():
+                self._done_callbacks.append(fn)
+                return
+        fn(self)
+
+    def _set_done(self):
+        with self._done_lock:
+            self._event.set()
+            callbacks, self._done_callbacks = self._done_callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+    def stream(self, callbacks):
+        """Parse the reply incrementally while it arrives instead of building it in memory as a
+        whole. *callbacks* maps element paths to functions called with each complete matching
+        element, see :class:`RPCReplyStream`. The reply of the request is then a
+        :class:`StreamedRPCReply`. Must be called before the request is made.
+        """
+        self._session.add_stream(self._id, RPCReplyStream(self, callbacks, huge_tree=self._huge_tree))
+
+    def _deliver_stream(self, error, errors):
+        # internal use
+        self._listener.unregister(self._id)
+        if error is not None:
+            self.deliver_error(error)
+        else:
+            self._reply = StreamedRPCReply(errors, huge_tree=self._huge_tree)
+            self._set_done()
+
     def deliver_reply(self, raw):
         # internal use
         self._reply = self.REPLY_CLS(raw, huge_tree=self._huge_tree)
-        self._event.set()
+        self._set_done()
 
     def deliver_error(self, err):
         # internal use
         self._error = err
-        self._event.set()
+        self._set_done()
 
     @property
     def reply(self):
@@ -0,0 +1,81 @@
+import pytest
+
+from ncclient.devices.default import DefaultDeviceHandler
+from ncclient.operations.retrieve import Get
+from ncclient.operations.rpc import RaiseMode, RPCError, StreamedRPCReply
+from ncclient.transport.session import Session
+
+REPLY = ('<rpc-reply xmlns="urn:ietf:params:xml:ns:netconf:base:1.0"'
+         ' message-id="{}">{}</rpc-reply>')
+ERROR = ('<rpc-error><error-type>application</error-type>'
+         '<error-tag>invalid-value</error-tag>'
+         '<error-severity>error</error-severity>'
+         '<error-message>{}</error-message></rpc-error>')
+
+
+class FakeSession(Session):
+    """Session whose requests are kept and whose replies are dispatched by
+    the test."""
+
+    def __init__(self):
+        Session.__init__(self, [])
+        self._connected = True
+        self._device_handler = DefaultDeviceHandler()
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def rpc(session, raise_mode=RaiseMode.ALL):
+    return Get(session, DefaultDeviceHandler(), async_mode=True,
+               raise_mode=raise_mode)
+
+
+def test_streamed_reply_with_errors():
+    session = FakeSession()
+    get = rpc(session)
+    get.stream({'data/item': lambda ele: None})
+    get.request()
+    session._dispatch_message(REPLY.format(
+        get.id, ERROR.format('first') + ERROR.format('second')))
+    assert get.event.is_set()
+    assert isinstance(get.reply, StreamedRPCReply)
+    with pytest.raises(RPCError) as raised:
+        get._process_reply()
+    assert [err.message for err in raised.value.errors] == ['first', 'second']
+    assert raised.value.severity == 'error'
+
+
+def test_done_callback_called_on_reply():
+    session = FakeSession()
+    get = rpc(session)
+    done = []
+    get.add_done_callback(done.append)
+    get.request()
+    assert done == []
+    session._dispatch_message(REPLY.format(get.id, '<data/>'))
+    assert done == [get]
+    assert get.reply.ok
+
+
+def test_done_callback_called_right_away_when_done():
+    session = FakeSession()
+    get = rpc(session)
+    get.request()
+    session._dispatch_message(REPLY.format(get.id, '<data/>'))
+    done = []
+    get.add_done_callback(done.append)
+    assert done == [get]
+
+
+def test_done_callback_called_on_error():
+    session = FakeSession()
+    get = rpc(session)
+    done = []
+    get.add_done_callback(done.append)
+    get.request()
+    error = Exception('connection lost')
+    session._dispatch_error(error)
+    assert done == [get]
+    assert get.error is error
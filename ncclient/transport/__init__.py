@@ -16,12 +16,14 @@
 
 from ncclient.transport.session import Session, SessionListener
 from ncclient.transport.ssh import SSHSession
+from ncclient.transport.metrics import SessionMetrics
 from ncclient.transport.errors import *
 
 __all__ = [
     'Session',
     'SessionListener',
     'SSHSession',
+    'SessionMetrics',
     'TransportError',
     'AuthenticationError',
     'SessionCloseError',
@@ -0,0 +1,238 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"NETCONF over SSH on an asyncio event loop, requires the asyncssh package."
+
+import asyncio
+import logging
+import time
+from io import BytesIO as StringIO
+
+try:
+    import asyncssh
+except ImportError:
+    raise ImportError('ncclient.transport.aiossh requires the asyncssh package,'
+                      ' install it with "pip install asyncssh"')
+
+from ncclient.capabilities import Capabilities
+from ncclient.logging_ import SessionLoggerAdapter
+from ncclient.transport.errors import AuthenticationError, SessionCloseError, SessionError, SSHError, SSHUnknownHostError, TransportError
+from ncclient.transport.parser import DefaultXMLParser
+from ncclient.transport.parser import SAXFilterXMLNotFoundError
+from ncclient.transport.session import Session, NetconfBase, HelloHandler, NotificationHandler
+from ncclient.transport.ssh import PORT_NETCONF_DEFAULT, MSG_DELIM, END_DELIM
+
+logger = logging.getLogger("ncclient.transport.aiossh")
+
+
+class _ChannelHandler(asyncssh.SSHClientSession):
+
+    "Hands the events of the NETCONF subsystem channel to the session."
+
+    def __init__(self, session):
+        self._session = session
+
+    def data_received(self, data, datatype):
+        self._session._data_received(data)
+
+    def connection_lost(self, exc):
+        self._session._connection_lost(exc)
+
+
+class AsyncSSHSession(Session):
+
+    """Implements a :rfc:`6242` NETCONF session over SSH on the running asyncio event loop.
+
+    Framing, reply parsing and listeners are the same as for :class:`~ncclient.transport.SSHSession`,
+    but no thread is started: incoming data is parsed and dispatched from the event loop."""
+
+    def __init__(self, device_handler):
+        capabilities = Capabilities(device_handler.get_capabilities())
+        Session.__init__(self, capabilities)
+        self._host = None
+        self._conn = None
+        self._channel = None
+        self._channel_id = None
+        self._channel_name = None
+        self._buffer = StringIO()
+        self._device_handler = device_handler
+        self._message_list = []
+        self._closing = False
+        self.parser = DefaultXMLParser(self)  # SAX or DOM parser
+
+        self.logger = SessionLoggerAdapter(logger, {'session': self})
+
+    def _dispatch_message(self, raw, size=None):
+        # Provide basic response message
+        self.logger.info("Received message from host")
+        # Provide complete response from host at debug log level
+        self.logger.debug("Received:\n%s", raw)
+        return super(AsyncSSHSession, self)._dispatch_message(raw, size)
+
+    def _data_received(self, data):
+        if self._metrics is not None:
+            self._metrics.received(self, len(data))
+        try:
+            try:
+                self.parser.parse(data)
+            except SAXFilterXMLNotFoundError:
+                self.logger.debug('switching from sax to dom parsing')
+                self.parser = DefaultXMLParser(self)
+                self.parser.parse(data)
+        except Exception as e:
+            self.logger.debug("Error handling received data, error=%r", e)
+            self._dispatch_error(e)
+            self.close()
+
+    def _connection_lost(self, exc):
+        self._connected = False
+        if not self._closing:
+            self.logger.debug("Channel closed, error=%r", exc)
+            self._dispatch_error(exc or SessionCloseError(self._buffer.getvalue()))
+
+    def close(self):
+        self._closing = True
+        self._connected = False
+        if self._channel:
+            self._channel.close()
+        if self._conn:
+            self._conn.close()
+
+    async def wait_closed(self):
+        "Wait for the SSH connection to be closed after :meth:`close`."
+        if self._conn:
+            await self._conn.wait_closed()
+
+    async def connect(
+            self,
+            host,
+            port                = PORT_NETCONF_DEFAULT,
+            timeout             = None,
+            username            = None,
+            password            = None,
+            key_filename        = None,
+            allow_agent         = True,
+            hostkey_verify      = True,
+            look_for_keys       = True,
+            **ssh_options):
+
+        """Connect via SSH and initialize the NETCONF session.
+
+        The arguments have the same meaning as for :meth:`ncclient.transport.SSHSession.connect`,
+        *timeout* covers both the SSH connection and opening the NETCONF subsystem. Any other
+        keyword argument is passed on to :func:`asyncssh.connect`, e.g. *known_hosts*.
+        """
+        self._host = host
+        if not hostkey_verify:
+            ssh_options['known_hosts'] = None
+        if not allow_agent:
+            ssh_options['agent_path'] = None
+        if key_filename is not None:
+            ssh_options['client_keys'] = [key_filename] if isinstance(key_filename, (str, bytes)) else key_filename
+        elif not look_for_keys:
+            ssh_options['client_keys'] = ()
+
+        try:
+            self._conn = await asyncio.wait_for(
+                asyncssh.connect(host, port, username=username, password=password, **ssh_options), timeout)
+        except asyncio.TimeoutError:
+            raise SSHError("Could not open socket to %s:%s" % (host, port))
+        except asyncssh.PermissionDenied as e:
+            raise AuthenticationError(repr(e))
+        except asyncssh.HostKeyNotVerifiable as e:
+            raise SSHUnknownHostError(host, e.reason)
+        except (OSError, asyncssh.Error) as e:
+            raise SSHError("Could not open connection to %s:%s: %s" % (host, port, e))
+
+        self._connected = True      # there was no error authenticating
+        self._closing = False
+
+        # the server may send its hello as soon as the channel is open
+        hello, listener = self._expect_hello()
+        subsystem_names = self._device_handler.get_ssh_subsystem_names()
+        for subname in subsystem_names:
+            try:
+                self._channel, _ = await self._conn.create_session(
+                    lambda: _ChannelHandler(self), subsystem=subname, encoding=None)
+            except asyncssh.ChannelOpenError as e:
+                self.logger.info("%s (subsystem request rejected)", e)
+                continue
+            self._channel_id = self._channel.get_extra_info('recv_channel')
+            self._channel_name = "%s-subsystem-%s" % (subname, self._channel_id)
+            await asyncio.wait_for(self._post_connect(hello, listener), timeout)
+            # for further upcoming RPC responses, vendor can chose their
+            # choice of parser. Say DOM or SAX
+            self.parser = self._device_handler.get_xml_parser(self)
+            return
+        raise SSHError("Could not open connection, possibly due to unacceptable"
+                       " SSH subsystem name.")
+
+    def _expect_hello(self):
+        """Install the listeners for the server's hello, returns a future resolved once it has
+        been received and the listener to remove then."""
+        hello = asyncio.get_running_loop().create_future()
+        # callbacks
+        def ok_cb(id, capabilities):
+            self._id = id
+            self._server_capabilities = capabilities
+            if not hello.done():
+                hello.set_result(None)
+        def err_cb(err):
+            if not hello.done():
+                hello.set_exception(err)
+        self.add_listener(NotificationHandler(self._notification_q))
+        listener = HelloHandler(ok_cb, err_cb)
+        self.add_listener(listener)
+        return hello, listener
+
+    async def _post_connect(self, hello, listener):
+        "Greeting stuff"
+        self.send(HelloHandler.build(self._client_capabilities, self._device_handler))
+        # we expect server's hello message, if server doesn't responds in 60 seconds raise exception
+        try:
+            await asyncio.wait_for(hello, 60)
+        except asyncio.TimeoutError:
+            raise SessionError("Capability exchange timed out")
+        finally:
+            self.remove_listener(listener)
+        if 'urn:ietf:params:netconf:base:1.1' in self._server_capabilities and 'urn:ietf:params:netconf:base:1.1' in self._client_capabilities:
+            self.logger.debug("After 'hello' message selecting netconf:base:1.1 for encoding")
+            self._base = NetconfBase.BASE_11
+        self.logger.info('initialized: session-id=%s | server_capabilities=%s',
+                         self._id, self._server_capabilities)
+
+    def send(self, message):
+        """Frame and write the supplied *message* (xml string) to the channel, the event loop
+        sends it out as soon as possible."""
+        if not self.connected:
+            raise TransportError('Not connected to NETCONF server')
+        self.logger.info("Sending:\n%s", message)
+        if self._metrics is not None:
+            # nothing is queued, writing starts right away
+            self._metrics.queued(message)
+        started = time.time()
+        data = message.encode('UTF-8')
+        if self._base == NetconfBase.BASE_11:
+            data = b'\n#%d\n' % len(data) + data + END_DELIM.encode()
+        else:
+            data = data + MSG_DELIM.encode()
+        self._channel.write(data)
+        if self._metrics is not None:
+            self._metrics.sent(self, message, len(data), started)
+
+    def run(self):
+        raise TransportError('AsyncSSHSession is driven by the asyncio event loop')
+
+    @property
+    def host(self):
+        """Host this session is connected to, or None if not connected."""
+        return self._host
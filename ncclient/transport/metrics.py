@@ -0,0 +1,184 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"Timings and sizes of the RPCs on NETCONF sessions."
+
+import bisect
+import time
+from collections import OrderedDict, deque
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+from ncclient.xml_ import sniff_root, SNIFF_SIZE
+
+#: Bucket bounds in seconds, 1 ms to about 9 minutes
+TIME_BOUNDS = tuple(0.001 * 2 ** i for i in range(20))
+#: Bucket bounds in bytes, 256 bytes to 1 GiB
+SIZE_BOUNDS = tuple(256 * 4 ** i for i in range(12))
+
+# RPCs waiting for a reply that are still tracked, the oldest are
+# forgotten beyond that (their session is probably gone)
+MAX_PENDING = 10000
+
+
+def _message_id(message):
+    root = sniff_root(message[:SNIFF_SIZE].encode('UTF-8'))
+    return root[1].get('message-id') if root else None
+
+
+class Histogram(object):
+
+    """Counts observations in buckets with fixed upper bounds, like a Prometheus histogram."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Upper bound of the bucket the *p* th percentile falls in, or the largest observation if
+        that is smaller. `None` if nothing has been observed."""
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            # cumulative counts, the last bucket has no upper bound
+            'buckets': [[bound, count] for bound, count in
+                        zip(self.bounds + (None,), _cumulative(self.counts))],
+        }
+
+
+def _cumulative(counts):
+    total = 0
+    for count in counts:
+        total += count
+        yield total
+
+
+class SessionMetrics(object):
+
+    """Records timings and sizes of the RPCs on the sessions it is installed on with
+    :meth:`~ncclient.transport.Session.set_metrics`. One instance can be shared by many sessions.
+
+    The following :class:`Histogram` are kept in :attr:`histograms`:
+
+    * `queue_wait`: seconds between queueing an RPC and starting to write it to the channel
+    * `send`: seconds spent writing an RPC to the channel
+    * `first_byte`: seconds between having written an RPC and receiving the first data after it
+    * `reply`: seconds between queueing an RPC and receiving its complete reply
+    * `parse`: seconds spent building the XML tree of a reply
+    * `bytes_out`: size of RPCs including framing
+    * `bytes_in`: size of replies as received, excluding framing
+
+    Time to first byte assumes replies arrive in the order the RPCs were sent on a session, which
+    NETCONF servers do.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        # message-id -> [queued, sent, first byte], oldest first
+        self._pending = OrderedDict()
+        # session -> message-ids sent on it, in order
+        self._in_flight = WeakKeyDictionary()
+        self.histograms = {
+            'queue_wait': Histogram(TIME_BOUNDS),
+            'send': Histogram(TIME_BOUNDS),
+            'first_byte': Histogram(TIME_BOUNDS),
+            'reply': Histogram(TIME_BOUNDS),
+            'parse': Histogram(TIME_BOUNDS),
+            'bytes_out': Histogram(SIZE_BOUNDS),
+            'bytes_in': Histogram(SIZE_BOUNDS),
+        }
+
+    def queued(self, message):
+        "Called by the session when *message* is queued for sending."
+        message_id = _message_id(message)
+        if message_id is None:
+            return
+        with self._lock:
+            self._pending[message_id] = [time.time(), None, None]
+            while len(self._pending) > MAX_PENDING:
+                self._pending.popitem(last=False)
+
+    def sent(self, session, message, size, started):
+        """Called by *session* when *message* has been written to its channel as *size* bytes,
+        which it started doing at *started*."""
+        message_id = _message_id(message)
+        now = time.time()
+        with self._lock:
+            self.histograms['send'].observe(now - started)
+            self.histograms['bytes_out'].observe(size)
+            timing = self._pending.get(message_id)
+            if timing is not None:
+                self.histograms['queue_wait'].observe(started - timing[0])
+                timing[1] = now
+                self._in_flight.setdefault(session, deque()).append(message_id)
+
+    def received(self, session, size):
+        "Called by *session* when *size* bytes have been read from its channel."
+        now = time.time()
+        with self._lock:
+            in_flight = self._in_flight.get(session)
+            while in_flight:
+                timing = self._pending.get(in_flight[0])
+                if timing is None:
+                    # replied to
+                    in_flight.popleft()
+                    continue
+                if timing[2] is None:
+                    timing[2] = now
+                    self.histograms['first_byte'].observe(now - timing[1])
+                break
+
+    def replied(self, message_id, size):
+        """Called by the session when the complete reply to *message_id* of *size* bytes has been
+        received."""
+        now = time.time()
+        with self._lock:
+            timing = self._pending.pop(message_id, None)
+            if timing is None:
+                return
+            self.histograms['reply'].observe(now - timing[0])
+            self.histograms['bytes_in'].observe(size)
+
+    def parsed(self, seconds):
+        "Called by an RPC when its reply took *seconds* to parse."
+        with self._lock:
+            self.histograms['parse'].observe(seconds)
+
+    def to_dict(self):
+        "Returns the histograms as a dictionary that can be serialized to JSON."
+        with self._lock:
+            return dict((name, histogram.to_dict()) for name, histogram in self.histograms.items())
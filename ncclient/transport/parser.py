@@ -24,11 +24,11 @@ except ImportError:
 
 from xml.sax.handler import ContentHandler
 
-from ncclient.transport.errors import NetconfFramingError
 from ncclient.transport.session import NetconfBase
 from ncclient.logging_ import SessionLoggerAdapter
 from ncclient.operations.errors import OperationError
 from ncclient.transport import SessionListener
+from ncclient.xml_ import sniff_root, SNIFF_SIZE
 
 import logging
 logger = logging.getLogger("ncclient.transport.parser")
@@ -46,6 +46,7 @@ BUF_SIZE = 4096
 # v1.0: RFC 4742
 MSG_DELIM = "]]>]]>"
 MSG_DELIM_LEN = len(MSG_DELIM)
+RE_MSG_DELIM = re.compile(re.escape(MSG_DELIM.encode()))
 # v1.1: RFC 6242
 END_DELIM = '\n##\n'
 
@@ -59,15 +60,7 @@ TICK = 0.1
 # * result.group(1) will contain the digit string for a chunk
 # * result.group(2) will be defined if '##' found
 #
-RE_NC11_DELIM = re.compile(r'\n(?:#([0-9]+)|(##))\n')
-
-if sys.version < '3':
-    def textify(buf):
-        return buf
-else:
-    def textify(buf):
-        return buf.decode('UTF-8')
-
+RE_NC11_DELIM = re.compile(br'\n(?:#([0-9]+)|(##))\n')
 
 class SAXParserHandler(SessionListener):
 
@@ -100,6 +93,10 @@ class DefaultXMLParser(object):
         """
         self._session = session
         self._parsing_pos10 = 0
+        self._parsing_pos11 = 0
+        # stream consuming the message being received: None if not known
+        # yet, False if the message is dispatched as a whole
+        self._stream = None
         self.logger = SessionLoggerAdapter(logger, {'session': self._session})
 
     def parse(self, data):
@@ -119,39 +116,66 @@ class DefaultXMLParser(object):
 
     def _parse10(self):
 
-        """Messages are delimited by MSG_DELIM. The buffer could have grown by
-        a maximum of BUF_SIZE bytes everytime this method is called. Retains
-        state across method calls and if a chunk has been read it will not be
-        considered again."""
+        """Messages are delimited by MSG_DELIM. Only the bytes added to the
+        buffer since the last call are searched (plus MSG_DELIM_LEN - 1 bytes
+        in case the delimiter is split over two chunks), directly on the
+        buffer's memory. Every complete message is decoded exactly once and
+        all of them are dispatched in one go."""
 
         self.logger.debug("parsing netconf v1.0")
         buf = self._session._buffer
-        buf.seek(self._parsing_pos10)
-        if MSG_DELIM in buf.read().decode('UTF-8'):
-            buf.seek(0)
-            msg, _, remaining = buf.read().decode('UTF-8').partition(MSG_DELIM)
+        messages = []
+        start = 0
+        with buf.getbuffer() as view:
+            buf_len = len(view)
+            match = RE_MSG_DELIM.search(view, self._parsing_pos10)
+            while match:
+                messages.append((bytes(view[start:match.start()]).decode('UTF-8'),
+                                 match.start() - start, match.end()))
+                start = match.end()
+                match = RE_MSG_DELIM.search(view, start)
+            remaining = bytes(view[start:]) if messages else None
+
+        if not messages:
+            # handle case that MSG_DELIM is split over two chunks
+            self._parsing_pos10 = max(0, buf_len - MSG_DELIM_LEN + 1)
+            return
+
+        self._session._buffer = StringIO()
+        self._parsing_pos10 = 0
+        for msg, msg_size, msg_end in messages:
             msg = msg.strip()
             if sys.version < '3':
-                self._session._dispatch_message(msg.encode())
+                self._session._dispatch_message(msg.encode(), msg_size)
             else:
-                self._session._dispatch_message(msg)
-            self._session._buffer = StringIO()
-            self._parsing_pos10 = 0
-            if len(remaining.strip()) > 0:
-                # There could be another entire message in the
-                # buffer, so we should try to parse again.
-                if type(self._session.parser) != DefaultXMLParser:
+                self._session._dispatch_message(msg, msg_size)
+            if type(self._session.parser) != DefaultXMLParser:
+                rest = buf.getvalue()[msg_end:]
+                if len(rest.strip()) > 0:
                     self.logger.debug('send remaining data to SAX parser')
-                    self._session.parser.parse(remaining.encode())
-                else:
-                    self.logger.debug('Trying another round of parsing since there is still data')
-                    self._session._buffer.write(remaining.encode())
-                    self._parse10()
-        else:
-            # handle case that MSG_DELIM is split over two chunks
-            self._parsing_pos10 = buf.tell() - MSG_DELIM_LEN
-            if self._parsing_pos10 < 0:
-                self._parsing_pos10 = 0
+                    self._session.parser.parse(rest)
+                    return
+
+        if len(remaining.strip()) > 0:
+            # keep the start of the next message, it has been searched already
+            self._session._buffer.write(remaining)
+            self._parsing_pos10 = max(0, len(remaining) - MSG_DELIM_LEN + 1)
+
+    def _start_stream(self, fragment):
+        """Called with the fragments of a new v1.1 message while streams are registered with the
+        session. Returns the stream registered for the message-id of the message, False if there
+        is none, or None if the start tag of the message is not complete yet."""
+        head = b''.join(self._session._message_list) + fragment
+        root = sniff_root(head)
+        if root is None:
+            return None if len(head) < SNIFF_SIZE else False
+        stream = self._session._pop_stream(root[1].get('message-id'))
+        if stream is None:
+            return False
+        if self._session._message_list:
+            stream.feed(b''.join(self._session._message_list))
+            self._session._message_list = []
+        return stream
 
     def _parse11(self):
 
@@ -159,82 +183,77 @@ class DefaultXMLParser(object):
         by the regex #RE_NC11_DELIM defined earlier in this file. Each
         time we get called here either a chunk delimiter or an
         end-of-message delimiter should be found iff there is enough
-        data. If there is not enough data, we will wait for more. If a
-        delimiter is found in the wrong place, a #NetconfFramingError
-        will be raised."""
+        data. If there is not enough data, we will wait for more.
+
+        The delimiters are matched directly on the buffer's memory starting
+        at #_parsing_pos11, chunk fragments are kept as bytes and joined and
+        decoded once per message."""
 
         self.logger.debug("_parse11: starting")
 
-        # suck in whole string that we have (this is what we will work on in
-        # this function) and initialize a couple of useful values
-        self._session._buffer.seek(0, os.SEEK_SET)
-        data = self._session._buffer.getvalue()
-        data_len = len(data)
-        start = 0
-        self.logger.debug('_parse11: working with buffer of %d bytes', data_len)
-        while True and start < data_len:
-            # match to see if we found at least some kind of delimiter
-            self.logger.debug('_parse11: matching from %d bytes from start of buffer', start)
-            re_result = RE_NC11_DELIM.match(data[start:].decode('utf-8'))
-            if not re_result:
-
-                # not found any kind of delimiter just break; this should only
-                # ever happen if we just have the first few characters of a
-                # message such that we don't yet have a full delimiter
-                self.logger.debug('_parse11: no delimiter found, buffer="%s"', data[start:].decode())
-                break
-
-            # save useful variables for reuse
-            re_start = re_result.start()
-            re_end = re_result.end()
-            self.logger.debug('_parse11: regular expression start=%d, end=%d', re_start, re_end)
-
-            # If the regex doesn't start at the beginning of the buffer,
-            # we're in trouble, so throw an error
-            if re_start != 0:
-                raise NetconfFramingError('_parse11: delimiter not at start of match buffer', data[start:])
-
-            if re_result.group(2):
-                # we've found the end of the message, need to form up
-                # whole message, save back remainder (if any) to buffer
-                # and dispatch the message
-                start += re_end
-                message = ''.join(self._session._message_list)
-                self._session._message_list = []
-                self.logger.debug('_parse11: found end of message delimiter')
-                self._session._dispatch_message(message)
-                break
-
-            elif re_result.group(1):
-                # we've found a chunk delimiter, and group(2) is the digit
-                # string that will tell us how many bytes past the end of
-                # where it was found that we need to have available to
-                # save the next chunk off
-                self.logger.debug('_parse11: found chunk delimiter')
-                digits = int(re_result.group(1))
-                self.logger.debug('_parse11: chunk size %d bytes', digits)
-                if (data_len-start) >= (re_end + digits):
-                    # we have enough data for the chunk
-                    fragment = textify(data[start+re_end:start+re_end+digits])
-                    self._session._message_list.append(fragment)
-                    start += re_end + digits
-                    self.logger.debug('_parse11: appending %d bytes', digits)
-                    self.logger.debug('_parse11: fragment = "%s"', fragment)
-                else:
-                    # we don't have enough bytes, just break out for now
-                    # after updating start pointer to start of new chunk
-                    start += re_start
-                    self.logger.debug('_parse11: not enough data for chunk yet')
-                    self.logger.debug('_parse11: setting start to %d', start)
+        buf = self._session._buffer
+        messages = []
+        with buf.getbuffer() as view:
+            data_len = len(view)
+            start = self._parsing_pos11
+            self.logger.debug('_parse11: working with buffer of %d bytes from %d', data_len, start)
+            while start < data_len:
+                # match to see if we found at least some kind of delimiter
+                re_result = RE_NC11_DELIM.match(view, start)
+                if not re_result:
+                    # not found any kind of delimiter just break; this should
+                    # only ever happen if we just have the first few
+                    # characters of a message such that we don't yet have a
+                    # full delimiter
+                    self.logger.debug('_parse11: no delimiter found at %d', start)
                     break
 
-        # Now out of the loop, need to see if we need to save back any content
-        if start > 0:
-            self.logger.debug(
-                '_parse11: saving back rest of message after %d bytes, original size %d',
-                start, data_len)
-            self._session._buffer = StringIO(data[start:])
-            if start < data_len:
-                self.logger.debug('_parse11: still have data, may have another full message!')
-                self._parse11()
+                re_end = re_result.end()
+                if re_result.group(2):
+                    # we've found the end of the message, join up the
+                    # fragments and dispatch once we're done with the buffer
+                    self.logger.debug('_parse11: found end of message delimiter')
+                    if self._stream:
+                        self._stream.close()
+                    else:
+                        message = b''.join(self._session._message_list)
+                        messages.append((message.decode('UTF-8'), len(message)))
+                    self._session._message_list = []
+                    self._stream = None
+                    start = re_end
+
+                else:
+                    # we've found a chunk delimiter, group(1) is the digit
+                    # string that tells us how many bytes past its end we
+                    # need to have available to save the chunk off
+                    digits = int(re_result.group(1))
+                    self.logger.debug('_parse11: found chunk delimiter, chunk size %d bytes', digits)
+                    if data_len < re_end + digits:
+                        self.logger.debug('_parse11: not enough data for chunk yet')
+                        break
+                    fragment = bytes(view[re_end:re_end + digits])
+                    if self._stream is None and self._session._streams:
+                        self._stream = self._start_stream(fragment)
+                    if self._stream:
+                        self._stream.feed(fragment)
+                    else:
+                        self._session._message_list.append(fragment)
+                    start = re_end + digits
+
+            # drop the consumed data once it is more than half the buffer
+            compact = start > data_len // 2
+            if compact:
+                remaining = bytes(view[start:])
+
+        if compact:
+            self.logger.debug('_parse11: saving back %d bytes of %d', data_len - start, data_len)
+            self._session._buffer = StringIO(remaining)
+            self._parsing_pos11 = 0
+        else:
+            self._parsing_pos11 = start
+
+        for message, size in messages:
+            if sys.version < '3':
+                message = message.encode()
+            self._session._dispatch_message(message, size)
         self.logger.debug('_parse11: ending')
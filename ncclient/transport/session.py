@@ -58,20 +58,39 @@ class Session(Thread):
         self.logger.debug('%r created: client_capabilities=%r',
                           self, self._client_capabilities)
         self._device_handler = None # Should be set by child class
-
-    def _dispatch_message(self, raw):
-        try:
-            root = parse_root(raw)
-        except Exception as e:
-            device_handled_raw=self._device_handler.handle_raw_dispatch(raw)
-            if isinstance(device_handled_raw, str):
-                root = parse_root(device_handled_raw)
-            elif isinstance(device_handled_raw, Exception):
-                self._dispatch_error(device_handled_raw)
-                return
-            else:
-                self.logger.error('error parsing dispatch message: %s', e)
+        self._streams = {} # message-id -> stream parsing that reply as it arrives
+        self._metrics = None
+
+    def _dispatch_message(self, raw, size=None):
+        """Hands the message *raw* to the listeners, or to the stream registered for it. *size* is
+        its size in bytes as received, if the caller knows it."""
+        # the start tag of the root element is usually all the listeners
+        # need, so avoid an XML parser and a copy of the whole message
+        head = raw[:SNIFF_SIZE]
+        root = sniff_root(head if isinstance(head, bytes) else head.encode('UTF-8'))
+        if root is None:
+            try:
+                root = parse_root(raw)
+            except Exception as e:
+                device_handled_raw=self._device_handler.handle_raw_dispatch(raw)
+                if isinstance(device_handled_raw, str):
+                    root = parse_root(device_handled_raw)
+                elif isinstance(device_handled_raw, Exception):
+                    self._dispatch_error(device_handled_raw)
+                    return
+                else:
+                    self.logger.error('error parsing dispatch message: %s', e)
+                    return
+        if self._streams:
+            stream = self._pop_stream(root[1].get('message-id'))
+            if stream is not None:
+                stream.feed(raw.encode('UTF-8'))
+                stream.close()
                 return
+        if self._metrics is not None and root[1].get('message-id') is not None:
+            if size is None:
+                size = len(raw) if isinstance(raw, bytes) else len(raw.encode('UTF-8'))
+            self._metrics.replied(root[1].get('message-id'), size)
         with self._lock:
             listeners = list(self._listeners)
         for l in listeners:
@@ -144,6 +163,26 @@ class Session(Thread):
         with self._lock:
             self._listeners.discard(listener)
 
+    def add_stream(self, message_id, stream):
+        """Hand the reply with *message_id* to *stream* instead of the listeners. The stream's
+        `feed` method is called with the bytes of the reply as they arrive and `close` once it is
+        complete.
+        """
+        with self._lock:
+            self._streams[message_id] = stream
+
+    def _pop_stream(self, message_id):
+        with self._lock:
+            return self._streams.pop(message_id, None)
+
+    def set_metrics(self, metrics):
+        """Record the timings and sizes of the RPCs on this session in *metrics*, or stop
+        recording them if *metrics* is `None`.
+
+        :type metrics: :class:`~ncclient.transport.metrics.SessionMetrics`
+        """
+        self._metrics = metrics
+
     def get_listener_instance(self, cls):
         """If a listener of the specified type is registered, returns the
         instance.
@@ -166,7 +205,15 @@ class Session(Thread):
         if not self.connected:
             raise TransportError('Not connected to NETCONF server')
         self.logger.debug('queueing %s', message)
+        if self._metrics is not None:
+            self._metrics.queued(message)
         self._q.put(message)
+        self._notify_send()
+
+    def _notify_send(self):
+        """Wake up the transport thread after a message was queued. Subclasses
+        that block waiting for incoming data implement this."""
+        pass
 
     def scp(self):
         raise NotImplementedError
@@ -21,6 +21,7 @@ import six
 import sys
 import socket
 import threading
+import time
 from binascii import hexlify
 
 try:
@@ -45,6 +46,8 @@ logger = logging.getLogger("ncclient.transport.ssh")
 PORT_NETCONF_DEFAULT = 830
 
 BUF_SIZE = 4096
+# default amount of data read from the channel and handed to the parser at once
+RECV_SIZE = 256 * 1024
 # v1.0: RFC 4742
 MSG_DELIM = "]]>]]>"
 # v1.1: RFC 6242
@@ -116,16 +119,20 @@ class SSHSession(Session):
         self._device_handler = device_handler
         self._message_list = []
         self._closing = threading.Event()
+        # socket pair used by send() and close() to wake up the run() loop
+        self._wakeup_r = None
+        self._wakeup_w = None
+        self._recv_size = RECV_SIZE
         self.parser = DefaultXMLParser(self)  # SAX or DOM parser
 
         self.logger = SessionLoggerAdapter(logger, {'session': self})
 
-    def _dispatch_message(self, raw):
+    def _dispatch_message(self, raw, size=None):
         # Provide basic response message
         self.logger.info("Received message from host")
         # Provide complete response from host at debug log level
         self.logger.debug("Received:\n%s", raw)
-        return super(SSHSession, self)._dispatch_message(raw)
+        return super(SSHSession, self)._dispatch_message(raw, size)
 
     def _parse(self):
         "Messages ae delimited by MSG_DELIM. The buffer could have grown by a maximum of BUF_SIZE bytes everytime this method is called. Retains state across method calls and if a byte has been read it will not be considered again."
@@ -153,8 +160,18 @@ class SSHSession(Session):
         else:
             self._host_keys.load(filename)
 
+    def _notify_send(self):
+        wakeup = self._wakeup_w
+        if wakeup is not None:
+            try:
+                wakeup.send(b'\0')
+            except socket.error:
+                # a wakeup is already pending or the main loop is gone
+                pass
+
     def close(self):
         self._closing.set()
+        self._notify_send()
         if self._transport.is_active():
             self._transport.close()
 
@@ -183,7 +200,10 @@ class SSHSession(Session):
             look_for_keys       = True,
             ssh_config          = None,
             sock_fd             = None,
-            bind_addr           = None):
+            bind_addr           = None,
+            recv_size           = RECV_SIZE,
+            window_size         = None,
+            max_packet_size     = None):
 
         """Connect via SSH and initialize the NETCONF session. First attempts the publickey authentication method and then password authentication.
 
@@ -216,11 +236,18 @@ class SSHSession(Session):
         *sock_fd* is an already open socket which shall be used for this connection. Useful for NETCONF outbound ssh. Use host=None together with a valid sock_fd number
 
         *bind_addr* is a (local) source IP address to use, must be reachable from the remote device.
+
+        *recv_size* is the maximum number of bytes read from the channel and handed to the parser at once (256 KiB by default)
+
+        *window_size* is the SSH channel window size in bytes, paramiko's default is used if not set
+
+        *max_packet_size* is the SSH channel maximum packet size in bytes, paramiko's default is used if not set
         """
         if not (host or sock_fd):
             raise SSHError("Missing host or socket fd")
 
         self._host = host
+        self._recv_size = recv_size
 
         # Optionally, parse .ssh/config
         config = {}
@@ -297,7 +324,12 @@ class SSHSession(Session):
                 sock = socket.fromfd(int(sock_fd), socket.AF_INET, socket.SOCK_STREAM)
             sock.settimeout(timeout)
 
-        self._transport = paramiko.Transport(sock)
+        transport_params = {}
+        if window_size is not None:
+            transport_params['default_window_size'] = window_size
+        if max_packet_size is not None:
+            transport_params['default_max_packet_size'] = max_packet_size
+        self._transport = paramiko.Transport(sock, **transport_params)
         self._transport.set_log_channel(logger.name)
         if config.get("compression") == 'yes':
             self._transport.use_compression()
@@ -382,6 +414,9 @@ class SSHSession(Session):
                 if not handle_exception:
                     continue
             self._channel_name = self._channel.get_name()
+            self._wakeup_r, self._wakeup_w = socket.socketpair()
+            self._wakeup_r.setblocking(False)
+            self._wakeup_w.setblocking(False)
             self._post_connect()
             # for further upcoming RPC responses, vendor can chose their
             # choice of parser. Say DOM or SAX
@@ -474,16 +509,38 @@ class SSHSession(Session):
         try:
             s = selectors.DefaultSelector()
             s.register(chan, selectors.EVENT_READ)
+            s.register(self._wakeup_r, selectors.EVENT_READ)
             self.logger.debug('selector type = %s', s.__class__.__name__)
             while True:
 
-                # Will wakeup evey TICK seconds to check if something
-                # to send, more quickly if something to read (due to
-                # select returning chan in readable list).
-                events = s.select(timeout=TICK)
-                if events:
-                    data = chan.recv(BUF_SIZE)
+                # Sleeps until there is something to read or send() queued
+                # a message; only wakes up every TICK seconds while a queued
+                # message waits for the channel to become writable.
+                events = s.select(timeout=None if q.empty() else TICK)
+                readable = False
+                for key, _ in events:
+                    if key.fileobj is chan:
+                        readable = True
+                    else:
+                        try:
+                            self._wakeup_r.recv(BUF_SIZE)
+                        except socket.error:
+                            pass
+                if readable:
+                    data = chan.recv(self._recv_size)
                     if data:
+                        # hand everything that has arrived so far to the
+                        # parser in one go
+                        if chan.recv_ready():
+                            batch = [data]
+                            batch_len = len(data)
+                            while batch_len < self._recv_size and chan.recv_ready():
+                                data = chan.recv(self._recv_size - batch_len)
+                                batch.append(data)
+                                batch_len += len(data)
+                            data = b''.join(batch)
+                        if self._metrics is not None:
+                            self._metrics.received(self, len(data))
                         try:
                             self.parser.parse(data)
                         except SAXFilterXMLNotFoundError:
@@ -496,24 +553,36 @@ class SSHSession(Session):
                     else:
                         # End of session, unexpected
                         raise SessionCloseError(self._buffer.getvalue())
+                elif self._closing.is_set():
+                    break
                 if not q.empty() and chan.send_ready():
                     self.logger.debug("Sending message")
-                    data = q.get()
+                    message = data = q.get()
                     if self._base == NetconfBase.BASE_11:
                         # REF: The line below is modified from the default ncclient-0.6.7
                         data = "%s%s%s" % (start_delim(len(data.encode())), data, END_DELIM)
                     else:
                         data = "%s%s" % (data, MSG_DELIM)
                     self.logger.info("Sending:\n%s", data)
+                    started = time.time()
+                    sent = 0
                     while data:
                         n = chan.send(data)
                         if n <= 0:
                             raise SessionCloseError(self._buffer.getvalue(), data)
                         data = data[n:]
+                        sent += n
+                    if self._metrics is not None:
+                        self._metrics.sent(self, message, sent, started)
         except Exception as e:
             self.logger.debug("Broke out of main loop, error=%r", e)
             self._dispatch_error(e)
             self.close()
+        finally:
+            wakeup_r, wakeup_w = self._wakeup_r, self._wakeup_w
+            self._wakeup_r = self._wakeup_w = None
+            wakeup_r.close()
+            wakeup_w.close()
 
     @property
     def host(self):
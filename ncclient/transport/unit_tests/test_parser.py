@@ -0,0 +1,117 @@
+from io import BytesIO
+import random
+
+from ncclient.transport.parser import DefaultXMLParser
+from ncclient.transport.session import NetconfBase
+
+REPLY = ('<rpc-reply xmlns="urn:ietf:params:xml:ns:netconf:base:1.0"'
+         ' message-id="{}"><data>{}</data></rpc-reply>')
+
+
+class FakeSession(object):
+
+    def __init__(self, base):
+        self._base = base
+        self._buffer = BytesIO()
+        self._message_list = []
+        self._streams = {}
+        self.messages = []
+        self.parser = DefaultXMLParser(self)
+
+    def _dispatch_message(self, raw, size=None):
+        self.messages.append((raw, size))
+
+
+def replies(count):
+    # multi-byte characters end up split over reads and chunks
+    return [REPLY.format(i, u'café ☃ ' * (i * 37 % 500))
+            for i in range(count)]
+
+
+def feed(session, data, seed, max_read=100):
+    rand = random.Random(seed)
+    start = 0
+    while start < len(data):
+        end = start + rand.randint(1, max_read)
+        session.parser.parse(data[start:end])
+        start = end
+
+
+def frame10(messages):
+    return b''.join(message.encode('UTF-8') + b']]>]]>'
+                    for message in messages)
+
+
+def test_parse10_random_reads():
+    messages = replies(20)
+    data = frame10(messages)
+    for seed in range(20):
+        session = FakeSession(NetconfBase.BASE_10)
+        feed(session, data, seed)
+        assert [raw for raw, _ in session.messages] == messages
+        assert [size for _, size in session.messages] == [
+            len(message.encode('UTF-8')) for message in messages]
+        assert session._buffer.getvalue() == b''
+
+
+def test_parse10_delimiter_split_over_reads():
+    message = REPLY.format(1, 'x')
+    data = message.encode('UTF-8') + b']]>]]>'
+    for split in range(len(data) - 6, len(data)):
+        session = FakeSession(NetconfBase.BASE_10)
+        session.parser.parse(data[:split])
+        assert session.messages == []
+        session.parser.parse(data[split:])
+        assert [raw for raw, _ in session.messages] == [message]
+
+
+def test_parse10_keeps_incomplete_message():
+    messages = replies(3)
+    data = frame10(messages)
+    session = FakeSession(NetconfBase.BASE_10)
+    session.parser.parse(data + b'<rpc-reply')
+    assert [raw for raw, _ in session.messages] == messages
+    assert session._buffer.getvalue() == b'<rpc-reply'
+
+
+def frame11(messages, seed, max_chunk=300):
+    rand = random.Random(seed)
+    framed = []
+    for message in messages:
+        message = message.encode('UTF-8')
+        start = 0
+        while start < len(message):
+            chunk = message[start:start + rand.randint(1, max_chunk)]
+            framed.append(b'\n#%d\n' % len(chunk) + chunk)
+            start += len(chunk)
+        framed.append(b'\n##\n')
+    return b''.join(framed)
+
+
+def test_parse11_random_chunks_and_reads():
+    messages = replies(20)
+    for seed in range(20):
+        session = FakeSession(NetconfBase.BASE_11)
+        feed(session, frame11(messages, seed), seed)
+        assert [raw for raw, _ in session.messages] == messages
+        assert [size for _, size in session.messages] == [
+            len(message.encode('UTF-8')) for message in messages]
+        assert session._message_list == []
+
+
+def test_parse11_all_at_once():
+    messages = replies(5)
+    session = FakeSession(NetconfBase.BASE_11)
+    session.parser.parse(frame11(messages, 0))
+    assert [raw for raw, _ in session.messages] == messages
+
+
+def test_parse11_waits_for_complete_chunk():
+    message = REPLY.format(1, 'x')
+    data = frame11([message], 0, max_chunk=len(message))
+    session = FakeSession(NetconfBase.BASE_11)
+    for end in range(1, len(data)):
+        session.parser.parse(data[end - 1:end])
+        assert session.messages == []
+    session.parser.parse(data[-1:])
+    assert [raw for raw, _ in session.messages] == [message]
@@ -0,0 +1,248 @@
+import asyncio
+import re
+
+import pytest
+
+pytest.importorskip('asyncssh')
+
+from ncclient import aiomanager
+from ncclient.operations import RPCError, TimeoutExpiredError
+from ncclient.transport import aiossh
+from ncclient.transport.errors import SessionCloseError
+from ncclient.transport.session import NetconfBase
+
+BASE_10 = 'urn:ietf:params:netconf:base:1.0'
+BASE_11 = 'urn:ietf:params:netconf:base:1.1'
+HELLO = ('<hello xmlns="urn:ietf:params:xml:ns:netconf:base:1.0">'
+         '<capabilities>{}</capabilities><session-id>7</session-id></hello>')
+REPLY = ('<rpc-reply xmlns="urn:ietf:params:xml:ns:netconf:base:1.0"'
+         ' message-id="{}">{}</rpc-reply>')
+ERROR = ('<rpc-error><error-type>application</error-type>'
+         '<error-tag>invalid-value</error-tag>'
+         '<error-severity>error</error-severity>'
+         '<error-message>{}</error-message></rpc-error>')
+
+
+class FakeServer(object):
+    """NETCONF server behind a fake asyncssh connection. It keeps the
+    framed data and the messages it receives, replies are sent by the test
+    in reads of a few bytes."""
+
+    def __init__(self, capabilities=(BASE_10, BASE_11), read_size=7):
+        self.capabilities = capabilities
+        self.read_size = read_size
+        self.data = b''
+        self.messages = []
+        self.pending = []
+        self.handler = None
+        self.closed = False
+        self._buffer = b''
+        self._base = NetconfBase.BASE_10
+
+    def start(self, handler):
+        self.handler = handler
+        self.send(HELLO.format(''.join(
+            '<capability>{}</capability>'.format(capability)
+            for capability in self.capabilities + (
+                'urn:ietf:params:netconf:capability:candidate:1.0',))))
+
+    def send(self, message):
+        data = message.encode('UTF-8')
+        if self._base == NetconfBase.BASE_11:
+            # two chunks, to have the client join them
+            half = len(data) // 2
+            data = (b'\n#%d\n' % half + data[:half] +
+                    b'\n#%d\n' % (len(data) - half) + data[half:] + b'\n##\n')
+        else:
+            data += b']]>]]>'
+        loop = asyncio.get_running_loop()
+        for start in range(0, len(data), self.read_size):
+            loop.call_soon(self.handler.data_received,
+                           data[start:start + self.read_size], None)
+
+    def reply(self, message_id, content='<data/>'):
+        self.pending.remove(message_id)
+        self.send(REPLY.format(message_id, content))
+
+    def received(self, data):
+        self.data += data
+        self._buffer += data
+        while True:
+            if self._base == NetconfBase.BASE_10:
+                message, found, rest = self._buffer.partition(b']]>]]>')
+                if not found:
+                    return
+            else:
+                match = re.match(br'\n#(\d+)\n', self._buffer)
+                end = match and match.end() + int(match.group(1))
+                if not match or self._buffer[end:end + 4] != b'\n##\n':
+                    return
+                message, rest = self._buffer[match.end():end], \
+                    self._buffer[end + 4:]
+            self._buffer = rest
+            self.receive(message.decode('UTF-8'))
+
+    def receive(self, message):
+        self.messages.append(message)
+        if len(self.messages) == 1:
+            # the client's hello
+            if BASE_11 in self.capabilities and BASE_11 in message:
+                self._base = NetconfBase.BASE_11
+            return
+        message_id = re.search('message-id="([^"]+)"', message).group(1)
+        if 'close-session' in message:
+            self.send(REPLY.format(message_id, '<ok/>'))
+        else:
+            self.pending.append(message_id)
+
+    def close(self):
+        self.closed = True
+        self.handler.connection_lost(None)
+
+
+class FakeChannel(object):
+
+    def __init__(self, server):
+        self.server = server
+
+    def write(self, data):
+        self.server.received(data)
+
+    def close(self):
+        pass
+
+    def get_extra_info(self, name):
+        return 0
+
+
+class FakeConnection(object):
+
+    def __init__(self, server):
+        self.server = server
+
+    async def create_session(self, factory, subsystem, encoding):
+        handler = factory()
+        self.server.start(handler)
+        return FakeChannel(self.server), handler
+
+    def close(self):
+        self.server.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+def connect(monkeypatch, server, timeout=5):
+    async def fake_connect(host, port, **kwds):
+        return FakeConnection(server)
+    monkeypatch.setattr(aiossh.asyncssh, 'connect', fake_connect)
+    return aiomanager.connect(host='router', username='admin',
+                              hostkey_verify=False, timeout=timeout)
+
+
+async def replies_pending(server, count):
+    async def wait():
+        while len(server.pending) < count:
+            await asyncio.sleep(0.001)
+    await asyncio.wait_for(wait(), 5)
+
+
+def test_hello_exchange(monkeypatch):
+    async def run():
+        server = FakeServer()
+        m = await connect(monkeypatch, server)
+        assert server.data.endswith(b'hello>]]>]]>')
+        assert BASE_11 in server.messages[0]
+        assert m.session_id == '7'
+        assert ':candidate' in m.server_capabilities
+        assert m._session._base == NetconfBase.BASE_11
+        await m.close_session()
+        assert server.closed
+    asyncio.run(run())
+
+
+def test_chunked_framing(monkeypatch):
+    async def run():
+        server = FakeServer()
+        m = await connect(monkeypatch, server)
+        request = asyncio.ensure_future(m.get())
+        await replies_pending(server, 1)
+        message = server.messages[-1].encode('UTF-8')
+        assert server.data.endswith(
+            b'\n#%d\n' % len(message) + message + b'\n##\n')
+        server.reply(server.pending[0])
+        assert (await request).ok
+    asyncio.run(run())
+
+
+def test_end_of_message_framing(monkeypatch):
+    async def run():
+        server = FakeServer(capabilities=(BASE_10,))
+        m = await connect(monkeypatch, server)
+        assert m._session._base == NetconfBase.BASE_10
+        request = asyncio.ensure_future(m.get())
+        await replies_pending(server, 1)
+        assert server.data.endswith(
+            server.messages[-1].encode('UTF-8') + b']]>]]>')
+        server.reply(server.pending[0])
+        assert (await request).ok
+    asyncio.run(run())
+
+
+def test_replies_resolve_their_requests(monkeypatch):
+    async def run():
+        server = FakeServer()
+        m = await connect(monkeypatch, server)
+        requests = [asyncio.ensure_future(m.get()) for _ in range(3)]
+        await replies_pending(server, 3)
+        message_ids = list(server.pending)
+        for message_id in reversed(message_ids):
+            server.reply(message_id, '<data>{}</data>'.format(message_id))
+        replies = await asyncio.gather(*requests)
+        assert [reply.data_ele.text for reply in replies] == message_ids
+    asyncio.run(run())
+
+
+def test_rpc_error(monkeypatch):
+    async def run():
+        server = FakeServer()
+        m = await connect(monkeypatch, server)
+        request = asyncio.ensure_future(m.get())
+        await replies_pending(server, 1)
+        server.reply(server.pending[0], ERROR.format('invalid'))
+        with pytest.raises(RPCError, match='invalid'):
+            await request
+    asyncio.run(run())
+
+
+def test_timeout_drops_late_reply(monkeypatch):
+    async def run():
+        server = FakeServer()
+        m = await connect(monkeypatch, server)
+        m.timeout = 0.05
+        with pytest.raises(TimeoutExpiredError):
+            await m.get()
+        listener = aiossh.Session.get_listener_instance(
+            m._session, aiomanager.operations.rpc.RPCReplyListener)
+        assert listener._id2rpc == {}
+        server.reply(server.pending[0])
+        m.timeout = 5
+        request = asyncio.ensure_future(m.get())
+        await replies_pending(server, 1)
+        server.reply(server.pending[0])
+        assert (await request).ok
+        assert m.connected
+    asyncio.run(run())
+
+
+def test_connection_lost(monkeypatch):
+    async def run():
+        server = FakeServer()
+        m = await connect(monkeypatch, server)
+        request = asyncio.ensure_future(m.get())
+        await replies_pending(server, 1)
+        server.close()
+        with pytest.raises(SessionCloseError):
+            await request
+        assert not m.connected
+    asyncio.run(run())
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from ncclient.devices.default import DefaultDeviceHandler
+from ncclient.manager import Manager
+from ncclient.operations import TimeoutExpiredError
+from ncclient.operations.rpc import RPCError
+from ncclient.transport.session import Session
+from ncclient.xml_ import to_ele
+
+REPLY = ('<rpc-reply xmlns="urn:ietf:params:xml:ns:netconf:base:1.0"'
+         ' message-id="{}">{}</rpc-reply>')
+ERROR = ('<rpc-error><error-type>application</error-type>'
+         '<error-tag>invalid-value</error-tag>'
+         '<error-severity>error</error-severity>'
+         '<error-message>{}</error-message></rpc-error>')
+
+
+class FakeSession(Session):
+    """Session whose requests are kept and whose replies are dispatched by
+    the test."""
+
+    def __init__(self):
+        Session.__init__(self, [])
+        self._connected = True
+        self._device_handler = DefaultDeviceHandler()
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(to_ele(message).get('message-id'))
+
+    def reply(self, message_id, content='<data/>'):
+        self._dispatch_message(REPLY.format(message_id, content))
+
+
+def manager(session, timeout=5):
+    return Manager(session, DefaultDeviceHandler(), timeout=timeout)
+
+
+def test_pipeline_replies_out_of_order():
+    session = FakeSession()
+    with manager(session).pipeline() as p:
+        futures = [p.get() for _ in range(3)]
+        assert len(session.sent) == 3
+        for message_id in reversed(session.sent):
+            session.reply(message_id)
+    assert all(future.done() for future in futures)
+    assert all(future.result().ok for future in futures)
+
+
+def test_pipeline_does_not_parse_on_the_session_thread():
+    session = FakeSession()
+    p = manager(session).pipeline()
+    future = p.get()
+    session.reply(session.sent[0])
+    assert future.done()
+    assert not future._processed
+    reply = future.result()
+    assert reply._parsed
+    assert future.result() is reply
+
+
+def test_pipeline_raises_rpc_errors_from_the_future():
+    session = FakeSession()
+    p = manager(session).pipeline()
+    future = p.get()
+    session.reply(session.sent[0], ERROR.format('invalid'))
+    assert isinstance(future.exception(), RPCError)
+    with pytest.raises(RPCError):
+        future.result()
+
+
+def test_pipeline_limits_rpcs_in_flight():
+    session = FakeSession()
+    p = manager(session, timeout=0.1).pipeline(max_in_flight=2)
+    p.get()
+    p.get()
+    with pytest.raises(TimeoutExpiredError):
+        p.get()
+    session.reply(session.sent[0])
+    p.get()
+    assert len(session.sent) == 3
+
+
+def test_pipeline_request_waits_for_a_reply():
+    session = FakeSession()
+    p = manager(session).pipeline(max_in_flight=1)
+    first = p.get()
+    thread = threading.Thread(target=p.get)
+    thread.start()
+    thread.join(0.1)
+    assert thread.is_alive()
+    session.reply(session.sent[0])
+    thread.join(5)
+    assert not thread.is_alive()
+    assert first.result().ok
+
+
+def test_pipeline_wait_times_out():
+    session = FakeSession()
+    p = manager(session).pipeline()
+    p.get()
+    with pytest.raises(TimeoutExpiredError):
+        p.wait(0.1)
@@ -17,6 +17,7 @@
 
 
 import io
+import re
 import sys
 import six
 import types
@@ -133,6 +134,46 @@ def parse_root(raw):
     for event, element in etree.iterparse(fp, events=('start',)):
         return (element.tag, element.attrib)
 
+
+#: How far into a message to look for the start tag of its root element
+SNIFF_SIZE = 4096
+# start tag of the root element, optionally preceded by an XML declaration;
+# attribute values with entity or character references are left to lxml
+RE_ROOT_START = re.compile(br'\s*(?:<\?xml[^>]*\?>\s*)?<([^\s/>]+)((?:\s+[^\s=/>]+\s*=\s*(?:"[^"<&]*"|\'[^\'<&]*\'))*)\s*/?>')
+RE_ROOT_ATTR = re.compile(br'([^\s=]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+def sniff_root(head):
+    """Returns the same tuple as :func:`parse_root` from the start tag of the root element at the
+    beginning of *head*, the first bytes of an XML document. Returns `None` if the start tag is
+    not complete yet or is not simple enough to be read without an XML parser."""
+    match = RE_ROOT_START.match(head)
+    if match is None:
+        return None
+    nsmap = {}
+    attrs = []
+    for name, value, value2 in RE_ROOT_ATTR.findall(match.group(2)):
+        name = name.decode('UTF-8')
+        value = (value or value2).decode('UTF-8')
+        if name == 'xmlns':
+            nsmap[None] = value
+        elif name.startswith('xmlns:'):
+            nsmap[name[6:]] = value
+        else:
+            attrs.append((name, value))
+    try:
+        prefix, _, name = match.group(1).decode('UTF-8').rpartition(':')
+        tag = qualify(name, nsmap[prefix or None]) if prefix or None in nsmap else name
+        attrib = {}
+        for name, value in attrs:
+            prefix, _, name = name.rpartition(':')
+            attrib[qualify(name, nsmap[prefix]) if prefix else name] = value
+    except KeyError:
+        # undeclared prefix such as xml:lang
+        return None
+    return (tag, attrib)
+
+
 def validated_element(x, tags=None, attrs=None):
     """Checks if the root element of an XML document or Element meets the supplied criteria.
 
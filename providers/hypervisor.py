@@ -1,9 +1,14 @@
 """Abstract base class for hypervisors."""
+import threading
 
 
 class Hypervisor(object):
+    # nodes are deployed in parallel, only one of them may ask at a time
+    prompt_lock = threading.Lock()
 
     def __init__(self, config, host, index):
         self.config = config
         self.host = host
         self.index = index
+        # serializes picking a free vm id and cloning on this host
+        self.lock = threading.Lock()
@@ -3,12 +3,14 @@ from proxmoxer import ProxmoxAPI
 from urllib.parse import quote
 
 from lib.log import debug, fatal, info
+from lib.trace import traced
 from providers.hypervisor import Hypervisor
 
 
 class Proxmox(Hypervisor):
     proxmox = None
 
+    @traced
     def init_api(self):
         node = ''
         if ':' in self.host:
@@ -28,8 +30,9 @@ class Proxmox(Hypervisor):
             self.default_node = nodes[0]
 
 
-    def deploy_vm(self, instance, assume_yes):
-        """Deploy a VM on the given hypervisor."""
+    @traced
+    def clone_vm(self, instance, assume_yes):
+        """Clone the template to a new VM, return its id."""
         if not self.proxmox:
             self.init_api()
             #fatal('No proxmox connection')
@@ -54,16 +57,35 @@ class Proxmox(Hypervisor):
             if id == new_id:
                 new_id += 1
 
-        info('Creating a new VM:\n * ID: {}\n * Name: {}\n * Host: {}'.format(
-            new_id, instance.name, self.host))
-        if not assume_yes:
-            yn = input('Continue [yN]? ')
-            if yn != 'y' and yn != 'Y':
-                return False
+        with self.prompt_lock:
+            info('Creating a new VM:\n * ID: {}\n * Name: {}\n * Host: {}'.format(
+                new_id, instance.name, self.host))
+            if not assume_yes:
+                yn = input('Continue [yN]? ')
+                if yn != 'y' and yn != 'Y':
+                    return None
         t = proxmox.nodes(node).qemu(template_id)
         info('VM is being created. This may take some time...')
         debug('Cloning template...')
         c = t.clone.create(newid=new_id, name=instance.name)
+        return new_id
+
+    @traced
+    def has_vm(self, vm_id, name):
+        """Check if the VM with the given id and name exists."""
+        with self.lock:
+            if not self.proxmox:
+                self.init_api()
+        for vm in self.proxmox.nodes(self.default_node).qemu.get():
+            if int(vm['vmid']) == vm_id and vm['name'] == name:
+                return True
+        return False
+
+    @traced
+    def configure_vm(self, instance, new_id):
+        """Set cloud-init and network options of a cloned VM."""
+        proxmox = self.proxmox
+        node = self.default_node
 
         ssh_key = instance.ssh_keys['root']
         ssh_key_quoted = quote(ssh_key, safe='')
@@ -89,8 +111,28 @@ class Proxmox(Hypervisor):
             adjustments['delete'] += ',net2'
 
         proxmox.nodes(node).qemu(new_id).config.set(**adjustments)
-        debug('Starting VM...')
-        proxmox.nodes(node).qemu(new_id).status.start.post()
+
+    @traced
+    def deploy_vm(self, instance, assume_yes):
+        """Deploy a VM on the given hypervisor."""
+        cloned = instance.journal.completed(
+            instance.name, 'cloned',
+            lambda data: self.has_vm(data['vm_id'], instance.name))
+        if cloned:
+            new_id = cloned['vm_id']
+        else:
+            # the new vm id is taken once the clone has been started
+            with self.lock:
+                new_id = self.clone_vm(instance, assume_yes)
+            if new_id is None:
+                return False
+            self.configure_vm(instance, new_id)
+            instance.journal.record(instance.name, 'cloned', vm_id=new_id)
+
+        status = self.proxmox.nodes(self.default_node).qemu(new_id).status
+        if status.current.get()['status'] != 'running':
+            debug('Starting VM...')
+            status.start.post()
         instance.init_iso_instance()
         return True
 
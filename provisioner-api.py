@@ -3,12 +3,14 @@
 import flask
 from flask import request, jsonify
 import lib.config_template as ct
-from lib.configurator import t128ConfigHelper
+from lib.configurator import t128ConfigError, t128ConfigHelper, t128SessionPool
+from ncclient.transport import SessionMetrics
 
 from jinja2 import Environment, FileSystemLoader, meta
 from jinja2.exceptions import TemplateNotFound
 import os
-from ncclient.operations.rpc import RPCError
+import signal
+import sys
 from lib.ote_utils.netconfutils.netconfconverter import ConfigParseError
 
 FLASK_DIR = 'flask_pages'
@@ -16,6 +18,10 @@ FLASK_DIR = 'flask_pages'
 def _load_environment():
   return Environment(loader=FileSystemLoader(FLASK_DIR))
 
+# NETCONF sessions are reused across requests to the same conductor
+netconf_metrics = SessionMetrics()
+netconf_pool = t128SessionPool(metrics=netconf_metrics)
+
 app = flask.Flask(__name__)
 app.config['DEBUG'] = True
 
@@ -65,31 +71,30 @@ def push_template():
 
     try:
         text_config = ct.get_text_config(context, context['template_name'])
-        with open('consolidatedT128Model.xml') as t128_model:
-            xml_config = ct.get_xml_config(text_config, t128_model)
+        xml_config = ct.get_xml_config(text_config, 'consolidatedT128Model.xml')
+        converter = ct.get_config_model('consolidatedT128Model.xml')
     except ConfigParseError as e:
         return "There was an error in the config: {}".format(e)
 
     try:
-        with t128ConfigHelper(host=conductor_netconf_ip) as ch:
-            edit_status = ch.edit(xml_config, 'conductor timeout error')
-    except RPCError as e:
+        with t128ConfigHelper(host=conductor_netconf_ip, pool=netconf_pool) as ch:
+            commit_status = ch.apply(xml_config, converter=converter)
+    except ConfigParseError as e:
         return "There was an error in the config: {}".format(e)
-
-    if isinstance(edit_status, str):
-        return edit_status
-
-    if edit_status.ok:
-        with t128ConfigHelper(host=conductor_netconf_ip) as ch:
-            try:
-                commit_status = ch.commit()
-            except RPCError as e:
-                return "There was an error committing the configuration, please check the candidate config: {}".format(e)
-            if commit_status.ok:
-                return "Configuration committed successfully"
-            else:
-                return "There was an error committing the config"
-    else:
-        return "There was an error adding the candidate config"
-
-app.run(host='0.0.0.0')
+    except t128ConfigError as e:
+        return "There was an error applying the config: {}".format(e)
+
+    if commit_status is None:
+        return "Configuration is already up to date"
+    return "Configuration committed successfully"
+
+@app.route('/api/v1/netconf_metrics', methods=['GET'])
+def api_netconf_metrics():
+    return jsonify(netconf_metrics.to_dict())
+
+# systemd stops the service with SIGTERM, exit through the finally below
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+try:
+    app.run(host='0.0.0.0')
+finally:
+    netconf_pool.close()
@@ -1,4 +1,5 @@
-from jinja2 import Environment, FileSystemLoader, meta
+# shared with the provisioner, the repository root has to be on PYTHONPATH
+from lib import template_cache
 
 TEMPLATE_DIR = 'config_templates'
 
@@ -10,7 +11,7 @@ def _filter_out_test_templates(template_name):
 
 
 def _load_config_template_environment():
-    return Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+    return template_cache.get_environment(TEMPLATE_DIR)
 
 
 def get_config_templates():
@@ -19,14 +20,9 @@ def get_config_templates():
 
 
 def get_template_variables(template_name):
-    jinja = _load_config_template_environment()
-    template_source = jinja.loader.get_source(jinja, template_name)[0]
-    parsed_content = jinja.parse(template_source)
-    return meta.find_undeclared_variables(parsed_content)
+    return template_cache.get_template_variables(TEMPLATE_DIR, template_name)
 
 
 def get_template_string_variables(template):
-    jinja = _load_config_template_environment()
-    #template_source = jinja.loader.get_source(jinja, template_name)[0]
-    parsed_content = jinja.parse(template)
-    return meta.find_undeclared_variables(parsed_content)
+    return template_cache.get_template_string_variables(TEMPLATE_DIR,
+                                                        template)